@@ -1,30 +1,87 @@
+import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_login import LoginManager
+from flask_migrate import Migrate
+from .blobstore import BlobStore, Thumbnailer
+from .cache import Cache
+from .ratelimit import LoginLimiter
+from .sessions import ServerSessionInterface
+from .instrumentation import Instrumentation
+from .routing import RoutingSQLAlchemy
+from . import profiles
 
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 login_manager = LoginManager()
+migrate = Migrate()
+blob_store = BlobStore()
+thumbnailer = Thumbnailer(blob_store)
+user_cache = Cache('user', maxsize=4096, ttl=60)   # short TTL bounds staleness across in-process caches
+fragment_cache = Cache('fragment', maxsize=1024, ttl=300)
+login_limiter = LoginLimiter()
+instrumentation = Instrumentation()
 
 
-def create_app():
-    """Construct the core flask_session_tutorial."""
+def create_app(config='config.Config', profile=None):
+    """
+    Construct the core flask_session_tutorial. `config` is an import path or object, as for from_object;
+    `profile` (default: the HOM_PROFILE environment variable) layers a deployment profile on top.
+    """
     app = Flask(__name__, instance_relative_config=False)
-    app.config.from_object('config.Config')
+    app.config.from_object(config)
+    profile = profile or os.environ.get('HOM_PROFILE')
+    if profile:
+        profiles.apply(app, profile)
+    if app.config.get('PROXY_FIX_HOPS'):
+        # Trust that many reverse proxies' X-Forwarded-For/-Proto, so remote_addr is the client, not the proxy
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
 
     # Initialize Plugins
+    app.session_interface = ServerSessionInterface.from_app(app)
     db.init_app(app)
+    profiles.configure_engines(app, db)
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(__file__), 'migrations'))
     login_manager.init_app(app)
+    blob_store.init_app(app)
+    user_cache.init_app(app)
+    fragment_cache.init_app(app)
+    login_limiter.init_app(app)
+    instrumentation.init_app(app)
+    instrumentation.register_counter('hom_login_attempts_total', 'outcome', login_limiter.stats,
+                                     'Login attempts by outcome, including rate-limited rejections')
 
     with app.app_context():
         from . import routes
         from . import auth
         from . import properties
+        from . import importer
+        from . import analytics
+        from . import ledger
+        from . import jobs
+        from . import fragments
+        from . import api
+        from . import search
+        from . import snapshots
+        from .models.user import hasher
+        hasher.init_app(app)
         app.register_blueprint(routes.main_bp)
         app.register_blueprint(auth.auth_bp)
         app.register_blueprint(properties.property_bp)
+        app.config.setdefault('MAX_CONTENT_LENGTH', properties.max_upload_size(app.config))
+        app.register_blueprint(api.api_bp)
+        app.cli.add_command(importer.import_command)
+        app.cli.add_command(analytics.rebuild_command)
+        app.cli.add_command(ledger.post_charges_command)
+        app.cli.add_command(jobs.worker_command)
+        app.cli.add_command(auth.calibrate_passwords)
+        app.cli.add_command(search.rebuild_command)
+        app.cli.add_command(snapshots.snapshot_command)
+        app.cli.add_command(properties.move_images_command)
 
-        # Create Database Models
-        db.create_all()
+        # Create Database Models, existing databases are upgraded with `flask db upgrade` instead
+        if app.config.get('AUTO_CREATE_TABLES', True):
+            db.create_all()
 
         return app
@@ -0,0 +1,191 @@
+"""Portfolio analytics, kept in the property_months summary table as leases, charges and payments change."""
+import calendar
+import datetime
+import click
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from . import db
+from .models.charge import Charge
+from .models.lease import Lease, as_datetime
+from .models.payment import Payment
+from .models.property import Property
+from .models.summary import PropertyMonth, mark_stale, month_start, next_month
+
+
+CHUNK_SIZE = 500    # properties per IN (...) list
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_stale_months(session, flush_context):
+    """Queue the property-months touched by every lease, charge and payment written in this flush."""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Lease):
+            starts, ends = values(obj, 'start_date'), values(obj, 'end_date')
+            if not starts:
+                continue
+            end = max(map(as_datetime, ends)) if ends and obj.end_date is not None else None
+            for property_id in values(obj, 'property_id'):
+                mark_stale(session, 'property', property_id, min(map(as_datetime, starts)), end)
+        elif isinstance(obj, (Payment, Charge)):
+            date_attr = 'date' if isinstance(obj, Payment) else 'due_date'
+            for lease_id in values(obj, 'lease_id'):
+                for date in values(obj, date_attr):
+                    mark_stale(session, 'lease', lease_id, date, date)
+
+
+@event.listens_for(Session, 'before_commit')
+def refresh_stale_months(session):
+    # Commit flushes only after this hook, so flush first to queue pending writes.
+    # Refreshing can autoflush more work, so drain until nothing new is queued
+    session.flush()
+    while session.info.get('stale_months'):
+        refresh(session, session.info.pop('stale_months'))
+
+
+def values(obj, attr):
+    """Current and pre-flush values of an attribute, so moved rows refresh both the old and new month."""
+    history = inspect(obj).attrs[attr].history
+    return {v for v in set(history.sum()) | {getattr(obj, attr)} if v is not None}
+
+
+def refresh(session, stale):
+    """
+    Recompute the summary rows for a set of ('property' | 'lease', id, month) markers.
+    Every month of a chunk of properties is refreshed together, so the statement count depends on
+    the number of properties touched, not on how many months a lease or back-dated payment spans.
+    """
+    lease_ids = {id_ for kind, id_, _ in stale if kind == 'lease'}
+    lease_property = dict(session.query(Lease.id, Lease.property_id).filter(Lease.id.in_(lease_ids))) \
+                     if lease_ids else {}
+    months = {}
+    for kind, id_, month in stale:
+        property_id = id_ if kind == 'property' else lease_property.get(id_)
+        if property_id is not None:
+            months.setdefault(int(property_id), set()).add(month)     # views may assign URL strings
+    if not months:
+        return
+
+    owners = dict(session.query(Property.id, Property.user_id).filter(Property.id.in_(list(months))))
+    property_ids = sorted(id_ for id_ in months if id_ in owners)
+    for i in range(0, len(property_ids), CHUNK_SIZE):
+        chunk = property_ids[i:i + CHUNK_SIZE]
+        refresh_properties(session, {id_: months[id_] for id_ in chunk}, owners)
+
+
+def refresh_properties(session, months, owners):
+    """Replace the summary rows for {property_id: months}; rent totals come from one grouped SQL query each."""
+    ids = list(months)
+    first = min(min(stale) for stale in months.values())
+    end = next_month(max(max(stale) for stale in months.values()))
+    leases = {}
+    for property_id, start, lease_end in session.query(Lease.property_id, Lease.start_date, Lease.end_date) \
+                                                .filter(Lease.property_id.in_(ids)):
+        leases.setdefault(property_id, []).append((start, lease_end))
+    due = monthly_totals(session.query(Lease.property_id, Charge.due_date, func.sum(Charge.amount))
+                                .join(Lease, Charge.lease_id == Lease.id)
+                                .filter(Lease.property_id.in_(ids), Charge.due_date >= first, Charge.due_date < end)
+                                .group_by(Lease.property_id, Charge.due_date))
+    collected = monthly_totals(session.query(Lease.property_id, Payment.date, func.sum(Payment.amount))
+                                      .join(Lease, Payment.lease_id == Lease.id)
+                                      .filter(Lease.property_id.in_(ids), Payment.date >= first, Payment.date < end)
+                                      .group_by(Lease.property_id, Payment.date))
+
+    now = datetime.datetime.utcnow()
+    pairs = [(id_, month) for id_ in ids for month in sorted(months[id_])]
+    table = PropertyMonth.__table__
+    session.execute(
+        table.delete().where(table.c.property_id == db.bindparam('target')).where(table.c.month == db.bindparam('target_month')),
+        [{'target': id_, 'target_month': month} for id_, month in pairs]
+    )
+    session.execute(table.insert(), [
+        dict(property_id=id_, user_id=owners[id_], month=month,
+             days=calendar.monthrange(month.year, month.month)[1],
+             occupied_days=occupied_days(leases.get(id_, []), month),
+             rent_due=due.get((id_, month)) or 0, rent_collected=collected.get((id_, month)) or 0, updated_on=now)
+        for id_, month in pairs
+    ])
+
+
+def monthly_totals(rows):
+    """{(property_id, month): total} from rows grouped by property and exact date."""
+    totals = {}
+    for property_id, date, amount in rows:
+        key = (property_id, month_start(as_datetime(date)))
+        totals[key] = totals.get(key, 0) + (amount or 0)
+    return totals
+
+
+def occupied_days(intervals, month):
+    """Days of `month` covered by at least one lease, overlapping leases are not double counted."""
+    first, last = month.date(), (next_month(month) - datetime.timedelta(days=1)).date()
+    covered = set()
+    for start, end in intervals:
+        start = max(as_datetime(start).date(), first)
+        end = min(as_datetime(end).date(), last) if end is not None else last
+        covered.update(range(start.toordinal(), end.toordinal() + 1))
+    return len(covered)
+
+
+def rebuild(user_id=None):
+    """Recompute every summary row, for one user or the whole database."""
+    session = db.session
+    leases = session.query(Lease.property_id, Lease.start_date, Lease.end_date) \
+                    .join(Property, Lease.property_id == Property.id)
+    if user_id is not None:
+        leases = leases.filter(Property.user_id == user_id)
+    spans = leases.all()
+    for i in range(0, len(spans), CHUNK_SIZE):   # one bounded refresh per commit
+        for property_id, start, end in spans[i:i + CHUNK_SIZE]:
+            mark_stale(session, 'property', property_id, as_datetime(start), as_datetime(end))
+        session.commit()
+
+
+def fill_missing(user_id, first_month, last_month=None):
+    """
+    Compute the summary rows missing between `first_month` and `last_month` (default: this month) for every
+    property the user owns, from the month it was added. Writes only queue the months a lease spans, so
+    vacant properties and months after a lease ends would otherwise have no row and count as occupied.
+    Returns how many rows were added; the caller commits.
+    """
+    months = [month_start(first_month)]
+    last = month_start(last_month or datetime.datetime.utcnow())
+    while next_month(months[-1]) <= last:
+        months.append(next_month(months[-1]))
+    existing = set(db.session.query(PropertyMonth.property_id, PropertyMonth.month)
+                             .filter(PropertyMonth.user_id == user_id, PropertyMonth.month >= months[0],
+                                     PropertyMonth.month <= last))
+    stale = {
+        ('property', property_id, month)
+        for property_id, created_on in db.session.query(Property.id, Property.created_on).filter(Property.user_id == user_id)
+        for month in months
+        if (property_id, month) not in existing and (created_on is None or month_start(created_on) <= month)
+    }
+    if stale:
+        refresh(db.session, stale)
+    return len(stale)
+
+
+def portfolio(user_id, first_month):
+    """Per-property summary rows plus per-month portfolio totals from `first_month` on, every owned property included."""
+    if fill_missing(user_id, first_month):
+        db.session.commit()
+    rows = PropertyMonth.query.filter(PropertyMonth.user_id == user_id, PropertyMonth.month >= first_month) \
+                              .order_by(PropertyMonth.month, PropertyMonth.property_id).all()
+    totals = db.session.query(
+        PropertyMonth.month,
+        func.count(PropertyMonth.property_id).label('units'),
+        func.sum(PropertyMonth.days).label('days'),
+        func.sum(PropertyMonth.occupied_days).label('occupied_days'),
+        func.sum(PropertyMonth.rent_due).label('rent_due'),
+        func.sum(PropertyMonth.rent_collected).label('rent_collected')
+    ).filter(PropertyMonth.user_id == user_id, PropertyMonth.month >= first_month) \
+     .group_by(PropertyMonth.month).order_by(PropertyMonth.month).all()
+    return rows, totals
+
+
+@click.command('rebuild-analytics')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this account.')
+def rebuild_command(user_id):
+    """Recompute the property_months summary table from leases, charges and payments."""
+    rebuild(user_id)
+    click.echo('Analytics rebuilt.')
@@ -0,0 +1,265 @@
+"""
+Read-only JSON API, mounted at /api/v1.
+
+    GET /api/v1/<resource>                  keyset-paged list (?sort=, ?order=, ?cursor=, ?limit=)
+    GET /api/v1/<resource>?ids=1,2,3        bulk fetch by id
+    GET /api/v1/<resource>/<id>             one row
+    ?fields=id,street                       sparse fieldset for the primary rows
+    ?fields[addresses]=city,zip             sparse fieldset for an included resource
+    ?include=address,leases                 related rows, side-loaded under "included"
+    GET /api/v1/portfolio?as_of=2025-12-31  occupancy, rates, renters and balances on a date
+
+Rows are selected as plain column tuples and serialized straight to JSON, no ORM objects are built.
+Every include is one extra `IN (...)` query per chunk of ids, however many rows the page has.
+All reads go to the read replica when one is configured (see routing.py).
+"""
+import datetime
+import json
+from flask import Blueprint, request, url_for, current_app
+from flask_login import current_user
+from . import db
+from .pagination import paginate, InvalidCursor, MAX_PAGE_SIZE
+from .routing import read_replica
+from .snapshots import portfolio_as_of
+from .models.address import Address
+from .models.lease import Lease
+from .models.payment import Payment
+from .models.property import Property
+from .models.renter import Renter
+try:
+    import orjson
+except ImportError:     # falls back to the standard library encoder
+    orjson = None
+
+
+CHUNK_SIZE = 500    # ids per IN (...) list
+
+
+# Blueprint Configuration
+api_bp = Blueprint('api_bp', __name__, url_prefix='/api/v1')
+
+
+class ApiError(Exception):
+    """Rendered as {"error": message} with `status`."""
+
+    def __init__(self, status, message):
+        super(ApiError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Resource(object):
+    """
+    A model exposed through the API. `owner(user_id)` is the clause restricting rows to one landlord,
+    `includes` maps an include name to (resource name, local column, remote column).
+    """
+
+    def __init__(self, model, owner, sorts, includes=None, exclude=()):
+        self.table = model.__table__
+        self.columns = {c.key: c for c in self.table.columns if c.key not in exclude}
+        self.owner = owner
+        self.sorts = {name: self.table.c[name] for name in sorts}
+        self.includes = includes or {}
+
+    def fields(self, requested):
+        """Columns for a comma-separated `?fields=` value; the id is always returned."""
+        if not requested:
+            return list(self.columns)
+        names = ['id'] + [name for name in requested.split(',') if name and name != 'id']
+        unknown = [name for name in names if name not in self.columns]
+        if unknown:
+            raise ApiError(400, 'Unknown fields: {}'.format(', '.join(unknown)))
+        return names
+
+    def select(self, names, user_id):
+        return db.session.query(*[self.columns[name] for name in names]).filter(self.owner(user_id))
+
+
+def owned_properties(user_id):
+    return db.session.query(Property.id).filter(Property.user_id == user_id)
+
+
+RESOURCES = {
+    'properties': Resource(
+        Property,
+        owner = lambda user_id: Property.user_id == user_id,
+        sorts = ('created_on', 'id'),
+        includes = {'address': ('addresses', 'address_id', 'id'), 'leases': ('leases', 'id', 'property_id')},
+        exclude = ('image',),
+    ),
+    'addresses': Resource(
+        Address,
+        owner = lambda user_id: Address.id.in_(
+            db.session.query(Property.address_id).filter(Property.user_id == user_id)),
+        sorts = ('created_on', 'id', 'zip'),
+    ),
+    'renters': Resource(
+        Renter,
+        owner = lambda user_id: Renter.user_id == user_id,
+        sorts = ('last_name', 'first_name', 'created_on', 'id'),
+        includes = {'leases': ('leases', 'id', 'renter_id'), 'payments': ('payments', 'id', 'renter_id')},
+    ),
+    'leases': Resource(
+        Lease,
+        owner = lambda user_id: Lease.property_id.in_(owned_properties(user_id)),
+        sorts = ('start_date', 'created_on', 'id'),
+        includes = {
+            'property': ('properties', 'property_id', 'id'),
+            'renter': ('renters', 'renter_id', 'id'),
+            'payments': ('payments', 'id', 'lease_id'),
+        },
+    ),
+    'payments': Resource(
+        Payment,
+        owner = lambda user_id: Payment.user_id == user_id,
+        sorts = ('created_on', 'date', 'amount', 'id'),
+        includes = {'renter': ('renters', 'renter_id', 'id'), 'lease': ('leases', 'lease_id', 'id')},
+    ),
+}
+
+
+@api_bp.route('/portfolio', methods=['GET'])
+@read_replica
+def portfolio():
+    """The whole portfolio as it stood at the end of ?as_of= (YYYY-MM-DD, default today)."""
+    if not current_user.is_authenticated:
+        raise ApiError(401, 'Authentication required')
+    try:
+        as_of = datetime.datetime.strptime(request.args.get('as_of') or datetime.date.today().isoformat(), '%Y-%m-%d')
+    except ValueError:
+        raise ApiError(400, 'as_of must be a YYYY-MM-DD date')
+    return json_response(portfolio_as_of(current_user.id, as_of))
+
+
+@api_bp.route('/<name>', methods=['GET'])
+@read_replica
+def index(name):
+    """A page of a resource, or exactly the rows listed in ?ids=."""
+    resource, includes = resolve(name)
+    names = selected_fields(resource, includes)
+    query = resource.select(names, current_user.id)
+
+    next_cursor = None
+    if 'ids' in request.args:
+        ids = parse_ids(request.args['ids'])
+        rows = query.filter(resource.table.c.id.in_(ids)).order_by(resource.table.c.id).all()
+    else:
+        key = lambda row, sort: (getattr(row, sort), row.id)
+        sort = request.args.get('sort', 'id')
+        if sort in resource.sorts and sort not in names:
+            query = query.add_columns(resource.sorts[sort])   # paginate seeks on it
+        try:
+            page = paginate(query, resource.sorts, resource.table.c.id, key, 'id')
+        except InvalidCursor:
+            raise ApiError(400, 'Invalid cursor')
+        rows, next_cursor = page.items, page.next_cursor
+
+    body = {
+        'data': [row_dict(row, requested(resource)) for row in rows],
+        'included': side_load(resource, includes, rows),
+    }
+    if 'ids' not in request.args:
+        body['next_cursor'] = next_cursor
+        body['next'] = next_url(name, next_cursor)
+    return json_response(body)
+
+
+@api_bp.route('/<name>/<int:id_>', methods=['GET'])
+@read_replica
+def show(name, id_):
+    resource, includes = resolve(name)
+    names = selected_fields(resource, includes)
+    row = resource.select(names, current_user.id).filter(resource.table.c.id == id_).first()
+    if row is None:
+        raise ApiError(404, 'Not found')
+    return json_response({
+        'data': row_dict(row, requested(resource)),
+        'included': side_load(resource, includes, [row]),
+    })
+
+
+@api_bp.errorhandler(ApiError)
+def api_error(error):
+    return json_response({'error': error.message}, error.status)
+
+
+#Functions
+def resolve(name):
+    """The resource and requested includes, after checking the caller may read them."""
+    if not current_user.is_authenticated:
+        raise ApiError(401, 'Authentication required')
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(404, 'Unknown resource {}'.format(name))
+    includes = [include for include in request.args.get('include', '').split(',') if include]
+    unknown = [include for include in includes if include not in resource.includes]
+    if unknown:
+        raise ApiError(400, 'Unknown includes: {}'.format(', '.join(unknown)))
+    return resource, includes
+
+
+def requested(resource):
+    return resource.fields(request.args.get('fields'))
+
+
+def selected_fields(resource, includes):
+    """Requested fields plus the local keys the includes join on."""
+    names = requested(resource)
+    for include in includes:
+        local = resource.includes[include][1]
+        if local not in names:
+            names.append(local)
+    return names
+
+
+def side_load(resource, includes, rows):
+    """Fetch every include for `rows` with chunked IN queries, grouped and de-duplicated by resource."""
+    included = {}
+    for include in includes:
+        target_name, local, remote = resource.includes[include]
+        target = RESOURCES[target_name]
+        keys = sorted({getattr(row, local) for row in rows} - {None})
+        names = target.fields(request.args.get('fields[{}]'.format(target_name)))
+        found = included.setdefault(target_name, {})
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            for row in target.select(names, current_user.id).filter(target.table.c[remote].in_(chunk)):
+                found[row.id] = row_dict(row, names)
+    return {name: list(found.values()) for name, found in included.items()}
+
+
+def parse_ids(value):
+    try:
+        ids = sorted({int(id_) for id_ in value.split(',') if id_})
+    except ValueError:
+        raise ApiError(400, 'ids must be a comma-separated list of integers')
+    if len(ids) > MAX_PAGE_SIZE:
+        raise ApiError(400, 'At most {} ids per request'.format(MAX_PAGE_SIZE))
+    return ids
+
+
+def row_dict(row, names):
+    mapping = row._mapping
+    return {name: mapping[name] for name in names}
+
+
+def next_url(name, cursor):
+    if cursor is None:
+        return None
+    args = request.args.to_dict()
+    args['cursor'] = cursor
+    return url_for('api_bp.index', name=name, **args)
+
+
+def json_response(body, status=200):
+    if orjson is not None:
+        data = orjson.dumps(body)
+    else:
+        data = json.dumps(body, default=json_default, separators=(',', ':'))
+    return current_app.response_class(data, status=status, mimetype='application/json')
+
+
+def json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(repr(value))
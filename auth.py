@@ -1,10 +1,15 @@
 """Routes for user authentication."""
+import click
 from flask import redirect, render_template, flash, Blueprint, request, url_for
 from flask_login import current_user, login_user
 from flask import current_app as app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from .forms import LoginForm, SignupForm
-from .models.user import User, db
-from . import login_manager
+from .models.user import User, db, hasher
+from . import login_manager, user_cache, login_limiter
+from .fragments import data_version
+from .sessions import regenerate
 
 
 # Blueprint Configuration
@@ -33,6 +38,7 @@ def signup():
             user.set_password(form.password.data)
             db.session.add(user)
             db.session.commit()  # Create new user
+            regenerate()
             login_user(user)  # Log in as newly created user
             return redirect(url_for('main_bp.dashboard'))
         flash('A user already exists with that email address.')
@@ -56,12 +62,25 @@ def login():
         return redirect(url_for('main_bp.dashboard'))  # Bypass if user is logged in
 
     form = LoginForm()
+    if request.method == 'POST' and not login_limiter.allow_ip(request.remote_addr):
+        return too_many_attempts(form)
     if form.validate_on_submit():
+        if not login_limiter.allow_account(form.email.data):
+            return too_many_attempts(form)
         user = User.query.filter_by(email=form.email.data).first()  # Validate Login Attempt
-        if user and user.check_password(password=form.password.data):
+        if user is None:
+            hasher.dummy_verify(form.password.data)
+            login_limiter.stats['unknown_email'] += 1
+        elif user.check_password(password=form.password.data):
+            if user.password_needs_rehash():    # upgrade old hashes while we have the plaintext
+                user.set_password(form.password.data)
+                db.session.commit()
+            regenerate()
             login_user(user)
+            login_limiter.stats['succeeded'] += 1
             next_page = request.args.get('next')
             return redirect(next_page or url_for('main_bp.dashboard'))
+        login_limiter.stats['failed'] += 1
         flash('Invalid username/password combination')
         return redirect(url_for('auth_bp.login'))
     return render_template(
@@ -73,12 +92,64 @@ def login():
     )
 
 
+def too_many_attempts(form):
+    """Rejected before any user lookup or hash verify."""
+    flash('Too many login attempts, please wait a minute and try again.')
+    return render_template(
+        'login.jinja2',
+        form=form,
+        title='Log in.',
+        template='login-page',
+        body="Log in with your User account."
+    ), 429
+
+
+@click.command('calibrate-passwords')
+@click.option('--scheme', type=click.Choice(['scrypt', 'pbkdf2', 'argon2']), default='scrypt', show_default=True)
+@click.option('--target-ms', default=250, show_default=True, help='Hash time to aim for on this machine.')
+def calibrate_passwords(scheme, target_ms):
+    """Suggest a PASSWORD_HASH_METHOD that takes about TARGET_MS per hash here."""
+    click.echo(hasher.calibrate(scheme, target_ms))
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    """Check if user is logged-in upon page load."""
-    if user_id is not None:
-        return User.query.get(user_id)
-    return None
+    """
+    Check if user is logged-in upon page load, from the identity cache when possible. Entries carry
+    the user's data version; when other workers keep their own caches (and miss our evictions) the
+    entry is only used while that version, a one-column primary-key lookup, is still current.
+    """
+    if user_id is None:
+        return None
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        version, state = cached
+        if user_cache.coherent or version == data_version(user_id):
+            return User.from_cache_state(state)
+    user = User.query.get(user_id)
+    if user is not None:
+        user_cache.set(user_id, [user.data_version, user.cache_state()])
+    return user
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_stale_users(session, flush_context):
+    """Remember users whose email, password or other columns changed in this transaction."""
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault('stale_users', set()).add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def evict_stale_users(session):
+    """Evict once committed, so a concurrent request cannot re-cache the old row."""
+    for user_id in session.info.pop('stale_users', ()):
+        user_cache.delete(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_stale_users(session):
+    session.info.pop('stale_users', None)
 
 
 @login_manager.unauthorized_handler
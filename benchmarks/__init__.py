@@ -0,0 +1,6 @@
+"""
+Benchmarks against the real routes: seed a synthetic portfolio, drive the app through the Flask
+test client and compare latency, query counts and memory with a stored baseline.
+
+    python -m hom.benchmarks --users 10 --properties 5000 --leases 3 --payments 24
+"""
@@ -0,0 +1,212 @@
+"""Drive the real routes through the Flask test client and compare the numbers with a baseline."""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from .. import create_app, db
+from ..models.property import Property
+from ..models.renter import Renter
+from . import seed
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SERVER_TIMING_QUERIES = re.compile(r'db;desc="(\d+) queries"')
+MEMORY_REQUESTS = 20    # tracemalloc slows everything down, so memory gets its own short pass
+
+
+class BenchmarkConfig(object):
+    """App settings for a benchmark run: CSRF and the login limiter off, page caching optional."""
+
+    SECRET_KEY = 'benchmark'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    WTF_CSRF_ENABLED = False
+    SESSION_BACKEND = 'memory'
+    LOGIN_IP_BURST = LOGIN_ACCOUNT_BURST = 10 ** 9
+    LOGIN_IP_PER_MINUTE = LOGIN_ACCOUNT_PER_MINUTE = 10 ** 9
+    N_PLUS_ONE_THRESHOLD = None
+
+    def __init__(self, database_url, page_cache=False):
+        self.SQLALCHEMY_DATABASE_URI = database_url
+        if not page_cache:
+            self.FRAGMENT_CACHE_SIZE = 0    # every request renders, as it would on a cache miss
+
+
+class Scenario(object):
+    """One route: `request(client, user_id, rng)` issues a single request and returns the response."""
+
+    def __init__(self, name, request):
+        self.name = name
+        self.request = request
+
+
+def scenarios(ids):
+    """The routes benchmarked; `ids[user_id]` holds sample property and renter ids for that user."""
+    def get(url):
+        return lambda client, user_id, rng: client.get(url(user_id, rng))
+
+    def login(client, user_id, rng):
+        return client.application.test_client().post(
+            '/login', data={'email': seed.user_email(user_id), 'password': seed.PASSWORD})
+
+    def add_payment(client, user_id, rng):
+        renter_id = rng.choice(ids[user_id]['renters'])
+        return client.post('/renter/{}/add_payment'.format(renter_id), data={
+            'date': time.strftime('%Y-%m-%d'), 'amount': '100.00', 'description': 'Benchmark payment'})
+
+    return [
+        Scenario('properties', get(lambda user_id, rng: '/properties')),
+        Scenario('renters', get(lambda user_id, rng: '/renters')),
+        Scenario('renter', get(lambda user_id, rng: '/renter/{}'.format(rng.choice(ids[user_id]['renters'])))),
+        Scenario('view_property', get(lambda user_id, rng: '/property/{}'.format(rng.choice(ids[user_id]['properties'])))),
+        Scenario('login', login),
+        Scenario('add_payment', add_payment),
+    ]
+
+
+def sample_ids(user_ids, size=200):
+    ids = {}
+    for user_id in user_ids:
+        ids[user_id] = {
+            'properties': [id_ for id_, in db.session.query(Property.id).filter_by(user_id=user_id).limit(size)],
+            'renters': [id_ for id_, in db.session.query(Renter.id).filter_by(user_id=user_id).limit(size)],
+        }
+    return ids
+
+
+def measure(scenario, clients, ids, requests, warmup, rng):
+    """Latency percentiles, mean queries per request (from Server-Timing) and the tracemalloc peak."""
+    user_ids = sorted(clients)
+    for i in range(warmup):
+        user_id = user_ids[i % len(user_ids)]
+        scenario.request(clients[user_id], user_id, rng)
+
+    latencies, queries, statuses = [], [], set()
+    for i in range(requests):
+        user_id = user_ids[i % len(user_ids)]
+        started = time.perf_counter()
+        response = scenario.request(clients[user_id], user_id, rng)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses.add(response.status_code)
+        match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+        if match:
+            queries.append(int(match.group(1)))
+
+    tracemalloc.start()
+    for i in range(min(requests, MEMORY_REQUESTS)):
+        user_id = user_ids[i % len(user_ids)]
+        scenario.request(clients[user_id], user_id, rng)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'p50': round(percentile(latencies, 50), 2),
+        'p90': round(percentile(latencies, 90), 2),
+        'p99': round(percentile(latencies, 99), 2),
+        'max': round(latencies[-1], 2),
+        'queries': round(statistics.mean(queries), 1) if queries else None,
+        'peak_kib': peak // 1024,
+        'statuses': sorted(statuses),
+    }
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted `values`."""
+    return values[max(math.ceil(pct / 100.0 * len(values)) - 1, 0)]
+
+
+def compare(results, baseline, tolerance):
+    """Regressions: p90 beyond `tolerance` of the baseline, or more queries per request than before."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p90'] > base['p90'] * (1 + tolerance):
+            regressions.append('{}: p90 {}ms vs baseline {}ms'.format(name, result['p90'], base['p90']))
+        if result['queries'] is not None and base.get('queries') is not None and result['queries'] > base['queries']:
+            regressions.append('{}: {} queries vs baseline {}'.format(name, result['queries'], base['queries']))
+    return regressions
+
+
+def report(results, baseline):
+    print('{:<14} {:>9} {:>9} {:>9} {:>9} {:>8} {:>10}  {}'.format(
+        'scenario', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'queries', 'peak KiB', 'vs baseline p90'))
+    for name, r in results.items():
+        base = baseline.get(name)
+        delta = '{:+.0%}'.format(r['p90'] / base['p90'] - 1) if base and base['p90'] else '-'
+        print('{:<14} {:>9} {:>9} {:>9} {:>9} {:>8} {:>10}  {}'.format(
+            name, r['p50'], r['p90'], r['p99'], r['max'], r['queries'], r['peak_kib'], delta))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m hom.benchmarks', description=__doc__)
+    parser.add_argument('--database', help='SQLAlchemy URL, default: a fresh SQLite file in a temp directory')
+    parser.add_argument('--reuse', action='store_true', help='benchmark an already seeded --database')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--properties', type=int, default=5000, help='per user')
+    parser.add_argument('--leases', type=int, default=3, help='per property, back to back')
+    parser.add_argument('--payments', type=int, default=24, help='months per lease')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--only', action='append', help='run just this scenario (repeatable)')
+    parser.add_argument('--page-cache', action='store_true', help='leave the per-user page cache on')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and request order')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p90 slowdown, default 20%%')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    database = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='hom-bench-'), 'bench.db')
+    app = create_app(BenchmarkConfig(database, args.page_cache))
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        if not args.reuse:
+            started = time.perf_counter()
+            counts = seed.seed(args.users, args.properties, args.leases, args.payments, args.seed)
+            print('Seeded {} in {:.1f}s'.format(
+                ', '.join('{} {}'.format(n, name) for name, n in counts.items()), time.perf_counter() - started))
+        user_ids = list(range(1, args.users + 1))
+        ids = sample_ids(user_ids)
+        db.session.remove()
+
+    clients = {}
+    for user_id in user_ids:
+        clients[user_id] = app.test_client()
+        clients[user_id].post('/login', data={'email': seed.user_email(user_id), 'password': seed.PASSWORD})
+
+    results = {}
+    for scenario in scenarios(ids):
+        if args.only and scenario.name not in args.only:
+            continue
+        results[scenario.name] = measure(scenario, clients, ids, args.requests, args.warmup, rng)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    for name, result in results.items():
+        if any(status >= 400 for status in result['statuses']):
+            print('warning: {} answered {}'.format(name, result['statuses']), file=sys.stderr)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('Baseline written to {}'.format(args.baseline))
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print('regression: ' + regression, file=sys.stderr)
+    return 1 if regressions else 0
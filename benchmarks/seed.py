@@ -0,0 +1,131 @@
+"""Synthetic portfolios, written straight into an empty database with chunked executemany INSERTs."""
+import datetime
+import random
+from .. import db, search
+from ..models.address import Address
+from ..models.charge import Charge
+from ..models.lease import Lease, add_months
+from ..models.payment import Payment
+from ..models.property import Property
+from ..models.renter import Renter
+from ..models.user import User, hasher
+
+
+PASSWORD = 'benchmark-password'
+CHUNK_SIZE = 10000
+MISSED_PAYMENT_RATE = 0.05
+STATES = ('CA', 'NY', 'TX', 'WA', 'OR', 'FL')
+STREETS = ('Oak', 'Maple', 'Pine', 'Cedar', 'Elm', 'Birch', 'Walnut', 'Spruce', 'Willow', 'Aspen')
+CITIES = ('Springfield', 'Riverton', 'Fairview', 'Kingston', 'Lakeside', 'Greenville', 'Salem', 'Madison')
+FIRST_NAMES = ('Ada', 'Ben', 'Cleo', 'Dev', 'Eli', 'Fay', 'Gus', 'Hana', 'Ivan', 'June', 'Kai', 'Lena')
+LAST_NAMES = ('Smith', 'Jones', 'Garcia', 'Nguyen', 'Patel', 'Kim', 'Brown', 'Silva', 'Cohen', 'Okafor')
+
+
+class Writer(object):
+    """Buffers rows per table and inserts them CHUNK_SIZE at a time, parents before children."""
+
+    ORDER = ('users', 'addresses', 'properties', 'renters', 'leases', 'charges', 'payments')
+    TABLES = {
+        'users': User.__table__, 'addresses': Address.__table__, 'properties': Property.__table__,
+        'renters': Renter.__table__, 'leases': Lease.__table__, 'charges': Charge.__table__,
+        'payments': Payment.__table__,
+    }
+
+    def __init__(self):
+        self.rows = {name: [] for name in self.ORDER}
+        self.counts = dict.fromkeys(self.ORDER, 0)
+
+    def add(self, name, row):
+        self.rows[name].append(row)
+        if len(self.rows[name]) >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        for name in self.ORDER:
+            if self.rows[name]:
+                db.session.execute(self.TABLES[name].insert(), self.rows[name])
+                self.counts[name] += len(self.rows[name])
+                self.rows[name] = []
+
+
+def seed(users=10, properties=5000, leases=3, payments=24, random_seed=1):
+    """
+    Write `users` landlords with `properties` properties each. Every property has `leases` back-to-back
+    leases of `payments` months, each with its own renter, charge schedule and monthly payments; the
+    last lease is running today. Balances are settled from the posted charges and payments.
+    Returns the row counts per table. Expects an empty database and commits.
+    """
+    rng = random.Random(random_seed)
+    now = datetime.datetime.utcnow()
+    this_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    first_start = add_months(this_month, -((leases - 1) * payments + payments // 2))
+    pwhash = hasher.hash(PASSWORD)
+    writer = Writer()
+    property_id = renter_id = lease_id = 0
+
+    for user_id in range(1, users + 1):
+        writer.add('users', dict(
+            id=user_id, username='bench{}'.format(user_id), first_name='Bench{}'.format(user_id),
+            last_name='User{}'.format(user_id), email=user_email(user_id), password=pwhash, created_on=now,
+        ))
+        for _ in range(properties):
+            property_id += 1
+            writer.add('addresses', dict(
+                id=property_id, street='{} {} St'.format(rng.randint(1, 9999), rng.choice(STREETS)),
+                city=rng.choice(CITIES), state=rng.choice(STATES), zip=rng.randint(10000, 99999), created_on=now,
+            ))
+            writer.add('properties', dict(id=property_id, user_id=user_id, address_id=property_id, created_on=now))
+            rate = float(rng.randrange(800, 4000, 25))
+            for n in range(leases):
+                renter_id += 1
+                lease_id += 1
+                start = add_months(first_start, n * payments)
+                end = add_months(start, payments) - datetime.timedelta(days=1)
+                lease = Lease(id=lease_id, start_date=start, end_date=end, rate=rate, terms=payments,
+                              property_id=property_id, renter_id=renter_id)
+                charges, paid, balance = [], [], 0.0
+                for due_date, amount, description in lease.schedule():
+                    posted = due_date <= now
+                    charges.append(dict(
+                        lease_id=lease_id, renter_id=renter_id, user_id=user_id, due_date=due_date,
+                        amount=amount, description=description, posted_on=now if posted else None, created_on=now,
+                    ))
+                    if not posted:
+                        continue
+                    balance += amount
+                    if rng.random() >= MISSED_PAYMENT_RATE:
+                        paid.append(dict(
+                            date=due_date, amount=amount, description='Rent', user_id=user_id,
+                            renter_id=renter_id, lease_id=lease_id, created_on=due_date,
+                        ))
+                        balance -= amount
+
+                # Parents are buffered before their children, so every chunk satisfies the foreign keys
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                writer.add('renters', dict(
+                    id=renter_id, user_id=user_id, first_name=first, last_name=last,
+                    email='{}.{}{}@example.com'.format(first, last, renter_id).lower(),
+                    phone='555-{:04d}'.format(renter_id % 10000), created_on=now, balance=balance,
+                ))
+                writer.add('leases', dict(
+                    id=lease_id, start_date=start, end_date=end, rate=rate, terms=payments,
+                    property_id=property_id, renter_id=renter_id, balance=balance, created_on=now,
+                ))
+                for row in charges:
+                    writer.add('charges', row)
+                for row in paid:
+                    writer.add('payments', row)
+    writer.flush()
+    if db.engine.dialect.name == 'postgresql':
+        # Ids were assigned here, move the sequences past them for the rows the app inserts later
+        for name in ('users', 'addresses', 'properties', 'renters', 'leases'):
+            db.session.execute(db.text(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), (SELECT MAX(id) FROM {0}))".format(name)
+            ))
+    search.rebuild()
+    db.session.commit()
+    return writer.counts
+
+
+def user_email(user_id):
+    return 'bench{}@example.com'.format(user_id)
@@ -0,0 +1,112 @@
+"""Content-addressed on-disk storage for uploaded files."""
+import hashlib
+import os
+import tempfile
+try:
+    from PIL import Image
+except ImportError:     # thumbnails are skipped without Pillow
+    Image = None
+
+
+class BlobTooLarge(Exception):
+    """Raised by BlobStore.put when a stream exceeds its size limit."""
+
+
+class BlobStore(object):
+    """
+    Stores each distinct file once under its sha256 digest, fanned out as <root>/ab/cd/<digest>.
+    Rows only keep the digest and size; the bytes never travel through the database.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, app=None):
+        self.root = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config.get('BLOB_STORE_PATH') or os.path.join(app.instance_path, 'blobs')
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, fileobj, max_size=None):
+        """
+        Copy `fileobj` into the store in CHUNK_SIZE pieces, hashing as it goes.
+        Returns (digest, size). Content that is already stored is not written twice.
+        Raises BlobTooLarge as soon as more than `max_size` bytes have been read.
+        """
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: fileobj.read(self.CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLarge(max_size)
+                    sha.update(chunk)
+                    out.write(chunk)
+            digest = sha.hexdigest()
+            dest = self.path(digest)
+            if os.path.exists(dest):
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.replace(tmp, dest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return digest, size
+
+    def mimetype(self, digest):
+        """Sniff the stored file's type from its magic bytes."""
+        with open(self.path(digest), 'rb') as file:
+            head = file.read(8)
+        if head.startswith(b'\x89PNG'):
+            return 'image/png'
+        if head.startswith(b'\xff\xd8\xff'):
+            return 'image/jpeg'
+        return 'application/octet-stream'
+
+
+class Thumbnailer(object):
+    """
+    Renders JPEG thumbnails of stored images. Runs as a background job ('thumbnail'),
+    so resizing large photos never holds up the request that uploaded them.
+    """
+
+    SIZE = 320
+
+    def __init__(self, store):
+        self.store = store
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def path(self, digest):
+        return self.store.path(digest) + '.thumb.jpg'
+
+    def render(self, digest):
+        dest = self.path(digest)
+        if os.path.exists(dest):
+            return dest
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix='.thumb-')
+        try:
+            with os.fdopen(fd, 'wb') as out, Image.open(self.store.path(digest)) as image:
+                image.draft('RGB', (self.SIZE, self.SIZE))    # lets the JPEG decoder downscale while reading
+                image.thumbnail((self.SIZE, self.SIZE))
+                image.convert('RGB').save(out, 'JPEG', quality=85)
+            os.replace(tmp, dest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return dest
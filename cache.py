@@ -0,0 +1,118 @@
+"""Small key/value caches: an in-process LRU with TTLs, or a shared Redis backend."""
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask.json.tag import JSONTag, TaggedJSONSerializer
+
+
+class TagDateTime(JSONTag):
+    """Exact, naive datetimes; Flask's own tag goes through HTTP dates, dropping microseconds and adding UTC."""
+    __slots__ = ()
+    key = ' dt'
+
+    def check(self, value):
+        return isinstance(value, datetime.datetime)
+
+    def to_json(self, value):
+        return value.isoformat()
+
+    def to_python(self, value):
+        return datetime.datetime.fromisoformat(value)
+
+
+# tagged JSON as in sessions.py, loading it can never run code planted in a shared store
+serializer = TaggedJSONSerializer()
+serializer.register(TagDateTime, index=0)
+
+
+class LRUBackend(object):
+    """Thread-safe in-process LRU. Each worker process holds its own copy."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class RedisBackend(object):
+    """Shared across workers and hosts; values are tagged JSON, so dicts, lists, strings, bytes and datetimes."""
+
+    def __init__(self, url, prefix, ttl):
+        import redis    # optional dependency, only needed when CACHE_REDIS_URL is set
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return serializer.loads(raw.decode('utf-8')) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, serializer.dumps(value).encode('utf-8'), ex=int(ttl or self.ttl))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class Cache(object):
+    """
+    Named cache configured from the app: `<NAME>_CACHE_SIZE` and `<NAME>_CACHE_TTL` size the
+    in-process LRU, and setting `CACHE_REDIS_URL` switches every cache to the shared Redis backend.
+    `coherent` is False when more than one worker holds its own LRU, so a delete in one worker
+    leaves stale entries in the others and readers must validate what they get.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=300, app=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = LRUBackend(maxsize, ttl)
+        self.coherent = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        prefix = self.name.upper()
+        ttl = app.config.get(prefix + '_CACHE_TTL', self.ttl)
+        if app.config.get('CACHE_REDIS_URL'):
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'], 'hom:{}:'.format(self.name), ttl)
+            self.coherent = True
+        else:
+            self.backend = LRUBackend(app.config.get(prefix + '_CACHE_SIZE', self.maxsize), ttl)
+            workers = int(app.config.get('WEB_CONCURRENCY') or os.environ.get('WEB_CONCURRENCY') or 1)
+            self.coherent = workers <= 1
+
+    def get(self, key):
+        return self.backend.get(str(key))
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(str(key), value, ttl)
+
+    def delete(self, key):
+        self.backend.delete(str(key))
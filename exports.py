@@ -0,0 +1,146 @@
+"""Streaming exports of the payment ledger and monthly rent rolls."""
+import csv
+import datetime
+import io
+from itertools import islice
+from sqlalchemy import func, or_
+from . import db
+from .models.address import Address
+from .models.charge import Charge
+from .models.lease import Lease
+from .models.payment import Payment
+from .models.property import Property
+from .models.renter import Renter
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:     # Parquet output is optional
+    pyarrow = None
+
+
+YIELD_PER = 1000
+CSV_ROWS_PER_CHUNK = 500
+PARQUET_ROWS_PER_GROUP = 50000
+
+LEDGER_COLUMNS = [
+    ('payment_id', 'int64'), ('date', 'timestamp[us]'), ('amount', 'float64'), ('description', 'string'),
+    ('renter_id', 'int64'), ('first_name', 'string'), ('last_name', 'string'), ('lease_id', 'int64'),
+    ('property_id', 'int64'), ('street', 'string'), ('city', 'string'), ('state', 'string'), ('zip', 'int64'),
+]
+RENT_ROLL_COLUMNS = [
+    ('lease_id', 'int64'), ('property_id', 'int64'), ('street', 'string'), ('city', 'string'),
+    ('state', 'string'), ('zip', 'int64'), ('renter_id', 'int64'), ('first_name', 'string'),
+    ('last_name', 'string'), ('rate', 'float64'), ('start_date', 'timestamp[us]'), ('end_date', 'timestamp[us]'),
+    ('due', 'float64'), ('paid', 'float64'),
+]
+
+
+def ledger_rows(user_id):
+    """Every payment received by `user_id` with its renter, lease and property, oldest first."""
+    return db.session.query(
+        Payment.id, Payment.date, Payment.amount, Payment.description,
+        Renter.id, Renter.first_name, Renter.last_name, Lease.id,
+        Property.id, Address.street, Address.city, Address.state, Address.zip
+    ).join(Renter, Payment.renter_id == Renter.id) \
+     .outerjoin(Lease, Payment.lease_id == Lease.id) \
+     .outerjoin(Property, Lease.property_id == Property.id) \
+     .outerjoin(Address, Property.address_id == Address.id) \
+     .filter(Payment.user_id == user_id) \
+     .order_by(Payment.date, Payment.id) \
+     .execution_options(stream_results=True) \
+     .yield_per(YIELD_PER)
+
+
+def rent_roll_rows(user_id, month):
+    """One row per lease active during `month` (a datetime on the 1st) with rent due and paid that month."""
+    month_end = (month + datetime.timedelta(days=32)).replace(day=1)
+    due = db.session.query(Charge.lease_id, func.sum(Charge.amount).label('amount')) \
+                    .filter(Charge.user_id == user_id, Charge.due_date >= month, Charge.due_date < month_end) \
+                    .group_by(Charge.lease_id).subquery()
+    paid = db.session.query(Payment.lease_id, func.sum(Payment.amount).label('amount')) \
+                     .filter(Payment.user_id == user_id, Payment.date >= month, Payment.date < month_end) \
+                     .group_by(Payment.lease_id).subquery()
+    return db.session.query(
+        Lease.id, Property.id, Address.street, Address.city, Address.state, Address.zip,
+        Renter.id, Renter.first_name, Renter.last_name, Lease.rate, Lease.start_date, Lease.end_date,
+        func.coalesce(due.c.amount, 0), func.coalesce(paid.c.amount, 0)
+    ).join(Property, Lease.property_id == Property.id) \
+     .join(Address, Property.address_id == Address.id) \
+     .outerjoin(Renter, Lease.renter_id == Renter.id) \
+     .outerjoin(due, due.c.lease_id == Lease.id) \
+     .outerjoin(paid, paid.c.lease_id == Lease.id) \
+     .filter(Property.user_id == user_id, Lease.start_date < month_end,
+             or_(Lease.end_date == None, Lease.end_date >= month)) \
+     .order_by(Property.id, Lease.start_date) \
+     .execution_options(stream_results=True) \
+     .yield_per(YIELD_PER)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def csv_stream(columns, rows):
+    """Yield CSV text a few hundred rows at a time, memory stays flat whatever the row count."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for chunk in chunked(rows, CSV_ROWS_PER_CHUNK):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _Drain(object):
+    """Write-only file that hands back whatever has been written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def parquet_stream(columns, rows):
+    """Yield a Parquet file one row group at a time; only the current row group is held in memory."""
+    schema = pyarrow.schema([(name, pyarrow.type_for_alias(type_)) for name, type_ in columns])
+    sink = _Drain()
+    writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode='w'), schema)
+    for chunk in chunked(rows, PARQUET_ROWS_PER_GROUP):
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)],
+            schema=schema
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+FORMATS = {
+    'csv': ('text/csv', csv_stream),
+    'parquet': ('application/vnd.apache.parquet', parquet_stream),
+}
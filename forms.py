@@ -1,9 +1,9 @@
 """Sign-up & log-in forms."""
 import datetime
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileRequired, FileAllowed
+from flask_wtf.file import FileRequired, FileAllowed, FileField
 # from flask_wtf.file import FileAllowed, FileRequired
-from wtforms import StringField, PasswordField, SubmitField, SelectField, IntegerField, FileField, DecimalField
+from wtforms import StringField, PasswordField, SubmitField, SelectField, IntegerField, DecimalField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional
 from wtforms.fields.html5 import DateField
 
@@ -0,0 +1,114 @@
+"""
+Per-user page caching. Every user has a data version that moves in the same transaction as any
+write to their properties, leases, renters or payments. Rendered pages are cached under it and
+the same key is the page's strong ETag, so an unchanged page costs one primary-key lookup.
+"""
+import datetime
+import functools
+import hashlib
+from flask import request, make_response
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from . import db, fragment_cache
+from .models.lease import Lease
+from .models.payment import Payment
+from .models.property import Property
+from .models.renter import Renter
+from .models.user import User
+
+
+def mark_changed(session, user_id):
+    """Queue a data version bump for writes the ORM doesn't see (Core inserts and updates)."""
+    if user_id is not None:
+        session.info.setdefault('changed_users', set()).add(user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_changed_users(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Property, Renter, Payment)):
+            attr = 'user_id'
+        elif isinstance(obj, User):
+            attr = 'id'
+        elif isinstance(obj, Lease):
+            history = inspect(obj).attrs.property_id.history
+            for property_id in set(history.sum()) | {obj.property_id}:
+                if property_id is not None:
+                    session.info.setdefault('changed_properties', set()).add(property_id)
+            continue
+        else:
+            continue
+        history = inspect(obj).attrs[attr].history
+        for user_id in set(history.sum()) | {getattr(obj, attr)}:
+            mark_changed(session, user_id)
+
+
+@event.listens_for(Session, 'before_commit')
+def bump_data_versions(session):
+    """Bump inside the committing transaction, so a reader never sees new rows under an old version."""
+    session.flush()
+    property_ids = session.info.pop('changed_properties', None)
+    if property_ids:
+        owners = session.query(Property.user_id).filter(Property.id.in_(property_ids))
+        session.info.setdefault('changed_users', set()).update(user_id for user_id, in owners)
+    user_ids = session.info.pop('changed_users', None)
+    if user_ids:
+        users = User.__table__
+        session.execute(
+            users.update().where(users.c.id.in_(user_ids)).values(data_version=users.c.data_version + 1)
+        )
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changed_users(session):
+    session.info.pop('changed_users', None)
+    session.info.pop('changed_properties', None)
+
+
+def data_version(user_id):
+    return db.session.query(User.data_version).filter(User.id == user_id).scalar() or 0
+
+
+def page_key(user_id):
+    """Same user, URL, data and UTC day (leases start and end with the calendar) means the same page."""
+    version = data_version(user_id)
+    raw = '{}|{}|{}|{}'.format(user_id, version, datetime.datetime.utcnow().date().isoformat(), request.full_path)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cached_page(before=None):
+    """
+    Cache a view's rendered HTML per user and answer If-None-Match with 304.
+    Only authenticated GETs are cached; `before` runs ahead of the lookup on every authenticated request,
+    for work that may itself change the data (and so the version).
+    Redirects and other non-string results pass through uncached.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return view(*args, **kwargs)
+            if before is not None:
+                before()
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+
+            etag = page_key(current_user.id)
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                body = fragment_cache.get(etag)
+                if body is None:
+                    body = view(*args, **kwargs)
+                    if not isinstance(body, str):
+                        return body
+                    fragment_cache.set(etag, body)
+                response = make_response(body)
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True  # always revalidate, the ETag makes that a 304
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
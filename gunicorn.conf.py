@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for the production profile:
+
+    gunicorn -c gunicorn.conf.py "hom:create_app()"
+
+Workers x threads is the request concurrency. Each worker opens at most its share of
+DB_MAX_CONNECTIONS (see profiles.pool_budget), so size that to the database's limit minus
+what the job workers and migrations need, not to the CPU count.
+"""
+import multiprocessing
+import os
+
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000             # recycle workers to bound slow leaks
+max_requests_jitter = 200       # without restarting them all at once
+preload_app = False             # every worker builds its own engine and pool after the fork
+accesslog = '-'
+
+# The app reads these to size its pools
+raw_env = [
+    'HOM_PROFILE=' + os.environ.get('HOM_PROFILE', 'production'),
+    'WEB_CONCURRENCY={}'.format(workers),
+    'GUNICORN_THREADS={}'.format(threads),
+]
@@ -0,0 +1,191 @@
+"""Bulk import of properties, renters and leases from CSV or NDJSON files."""
+import codecs
+import csv
+import json
+import click
+from werkzeug.datastructures import MultiDict
+from . import db
+from .forms import PropertyForm, RenterForm, LeaseForm
+from .fragments import mark_changed
+from . import search
+from .occupancy import OccupancyIndex
+from .models.address import Address
+from .models.charge import Charge
+from .models.lease import Lease
+from .models.property import Property
+from .models.renter import Renter
+from .models.user import User
+
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(Exception):
+    """A row that failed validation, carrying the form's field errors."""
+
+    def __init__(self, errors):
+        super(RowError, self).__init__(errors)
+        self.errors = errors
+
+
+def read_rows(stream, fmt):
+    """
+    Yield one dict per CSV record or NDJSON line from a binary stream, decoding as it reads.
+    Lines that are not valid JSON are yielded as RowError so they show up in the report.
+    """
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    if fmt == 'csv':
+        for row in csv.DictReader(lines):
+            yield row
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield RowError({'row': [str(e)]})
+            continue
+        yield row if isinstance(row, dict) else RowError({'row': ['Expected a JSON object']})
+
+
+def format_for(filename):
+    return 'csv' if filename.lower().endswith('.csv') else 'ndjson'
+
+
+def validated(form_class, row, **choices):
+    """Run a row through the same WTForms rules as the single-row views."""
+    formdata = MultiDict((k, str(v)) for k, v in row.items() if v is not None and k is not None)
+    form = form_class(formdata=formdata, meta={'csrf': False})
+    for field, values in choices.items():
+        getattr(form, field).choices = values
+    if not form.validate():
+        raise RowError(form.errors)
+    return form
+
+
+class PropertyImporter(object):
+    """Columns: street, city, state, zip"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def validate(self, row):
+        form = validated(PropertyForm, row)
+        return dict(street=form.street.data, city=form.city.data, state=form.state.data, zip=form.zip.data)
+
+    def insert(self, batch):
+        # Properties need their address ids, so these go through the ORM and flush once per batch
+        db.session.add_all([Property(user_id=self.user_id, address=Address(**values)) for values in batch])
+        db.session.flush()
+
+
+class RenterImporter(object):
+    """Columns: first_name, last_name, email, phone"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def validate(self, row):
+        form = validated(RenterForm, row)
+        return dict(first_name=form.first_name.data, last_name=form.last_name.data,
+                    email=form.email.data, phone=form.phone.data, user_id=self.user_id)
+
+    def insert(self, batch):
+        last_id = db.session.query(db.func.max(Renter.id)).scalar() or 0
+        db.session.execute(Renter.__table__.insert(), batch)
+        # Core inserts skip the ORM events, so queue the new renters for the search index here
+        new_ids = db.session.query(Renter.id).filter(Renter.user_id == self.user_id, Renter.id > last_id)
+        search.mark_stale(db.session, 'renter', [id_ for id_, in new_ids])
+
+
+class LeaseImporter(object):
+    """Columns: property_id, renter (renter id), start_date, end_date (YYYY-MM-DD), rate, terms"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.renters = [(str(id_), str(id_)) for id_, in db.session.query(Renter.id).filter_by(user_id=user_id)]
+        self.properties = {id_ for id_, in db.session.query(Property.id).filter_by(user_id=user_id)}
+        self.occupancy = OccupancyIndex.load(self.properties)
+
+    def validate(self, row):
+        form = validated(LeaseForm, row, renter=self.renters)
+        try:
+            property_id = int(row.get('property_id'))
+        except (TypeError, ValueError):
+            property_id = None
+        if property_id not in self.properties:
+            raise RowError({'property_id': ['Not one of your properties']})
+        clashes = self.occupancy.overlaps(property_id, form.start_date.data, form.end_date.data)
+        if clashes:
+            raise RowError({'start_date': ['Overlaps another lease on this property']})
+        # Rows accepted earlier in the file count too; they have no id until their batch flushes
+        self.occupancy.add(property_id, form.start_date.data, form.end_date.data, (None, None))
+        return dict(start_date=form.start_date.data, end_date=form.end_date.data, rate=form.rate.data,
+                    terms=form.terms.data, renter_id=int(form.renter.data), property_id=property_id)
+
+    def insert(self, batch):
+        # Leases flush for their ids, then the whole batch's charge schedules go in one executemany
+        leases = [Lease(**values) for values in batch]
+        db.session.add_all(leases)
+        db.session.flush()
+        charges = [row for lease in leases for row in lease.charge_rows(self.user_id)]
+        if charges:
+            db.session.execute(Charge.__table__.insert(), charges)
+
+
+IMPORTERS = {
+    'properties': PropertyImporter,
+    'renters': RenterImporter,
+    'leases': LeaseImporter,
+}
+
+
+def import_rows(kind, rows, user_id, batch_size=BATCH_SIZE):
+    """
+    Validate and insert `rows` for `user_id`, committing every `batch_size` valid rows.
+    Invalid rows are skipped and reported by their 1-based row number.
+    """
+    importer = IMPORTERS[kind](user_id)
+    report = {'kind': kind, 'inserted': 0, 'error_count': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        importer.insert(batch)
+        mark_changed(db.session, user_id)   # renters go in through Core, which the ORM events don't see
+        db.session.commit()
+        report['inserted'] += len(batch)
+        del batch[:]
+
+    for number, row in enumerate(rows, start=1):
+        try:
+            if isinstance(row, RowError):
+                raise row
+            batch.append(importer.validate(row))
+        except RowError as e:
+            report['error_count'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': number, 'errors': e.errors})
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
+
+
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('file', type=click.File('rb'))
+@click.option('--user', 'email', required=True, help='Email of the account that will own the rows.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+def import_command(kind, file, email, batch_size):
+    """Bulk import KIND rows from a CSV or NDJSON FILE."""
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.BadParameter('No user with that email', param_hint='--user')
+    report = import_rows(kind, read_rows(file, format_for(file.name)), user.id, batch_size)
+    for error in report['errors']:
+        click.echo('row {row}: {errors}'.format(**error), err=True)
+    click.echo('Imported {inserted} {kind}, {error_count} rows rejected.'.format(**report))
@@ -0,0 +1,166 @@
+"""
+Per-request SQL and template timing.
+
+Every request counts its queries, database time and template render time, reports them in a
+`Server-Timing` header and adds them to process-wide totals served at /metrics in the Prometheus
+text format. Statements are fingerprinted, and a shape repeating more than N_PLUS_ONE_THRESHOLD
+times in one request is logged as a likely N+1. Totals are per worker process, so scrape each worker
+or aggregate in Prometheus. Requests are tallied when the response is closed, so streamed bodies
+count the queries their generators run.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+WHITESPACE = re.compile(r'\s+')
+PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%s|:\w+|%\(\w+\)s)\s*,?)+\)')
+LITERAL = re.compile(r"\b\d+\b|'(?:[^']|'')*'")
+
+
+def fingerprint(statement):
+    """Statement shape with literals and IN (...) lists collapsed, so `WHERE id IN (?, ?)` and `(?, ?, ?)` match."""
+    statement = LITERAL.sub('?', WHITESPACE.sub(' ', statement.strip()))
+    return PLACEHOLDER_LIST.sub('(?)', statement)
+
+
+class RequestStats(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.templates = []
+        self.shapes = Counter()
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+        stats.shapes[fingerprint(statement)] += 1
+
+
+class Instrumentation(object):
+    """
+    SERVER_TIMING (default True) controls the response header, N_PLUS_ONE_THRESHOLD (default 10,
+    None disables) the repeated-statement warning, and METRICS_PATH (default /metrics) the endpoint.
+    Other extensions can publish a Counter through `register_counter`.
+    """
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.totals = Counter()         # (metric, labels) -> value
+        self.counters = []
+        self.threshold = 10
+        self.server_timing = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 10)
+        self.server_timing = app.config.get('SERVER_TIMING', True)
+        self.logger = app.logger
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        before_render_template.connect(self.start_template, app)
+        template_rendered.connect(self.end_template, app)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.metrics)
+
+    def register_counter(self, name, label, counter, help_text=''):
+        """Expose a collections.Counter as `name{label="key"} value`."""
+        self.counters.append((name, label, counter, help_text))
+
+    # Request hooks
+    def start_request(self):
+        g._request_stats = RequestStats()
+
+    def start_template(self, sender, template, context, **extra):
+        stats = current_stats()
+        if stats is not None:
+            stats.templates.append(time.perf_counter())
+
+    def end_template(self, sender, template, context, **extra):
+        stats = current_stats()
+        if stats is not None and stats.templates:
+            stats.template_time += time.perf_counter() - stats.templates.pop()
+
+    def finish_request(self, response):
+        stats = current_stats()
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        if self.server_timing and not response.is_streamed:    # a streamed body has not run yet
+            elapsed = time.perf_counter() - stats.started
+            response.headers.add('Server-Timing', 'db;desc="{} queries";dur={:.1f}'.format(stats.queries, stats.db_time * 1000))
+            response.headers.add('Server-Timing', 'tpl;dur={:.1f}'.format(stats.template_time * 1000))
+            response.headers.add('Server-Timing', 'app;dur={:.1f}'.format(elapsed * 1000))
+        # The request context may be gone by close time, so everything it provides is bound now
+        endpoint, method, status = request.endpoint or 'unmatched', request.method, str(response.status_code)
+        response.call_on_close(lambda: self.record(stats, endpoint, method, status))
+        return response
+
+    def record(self, stats, endpoint, method, status):
+        """Log likely N+1s and add one finished request to the totals."""
+        elapsed = time.perf_counter() - stats.started
+        repeated = []
+        if self.threshold:
+            repeated = [(shape, count) for shape, count in stats.shapes.items() if count > self.threshold]
+            for shape, count in repeated:
+                self.logger.warning('Possible N+1 in %s: %d queries shaped like %s', endpoint, count, shape[:300])
+
+        labels = (('endpoint', endpoint),)
+        with self.lock:
+            self.totals['hom_http_requests_total', labels + (('method', method), ('status', status))] += 1
+            self.totals['hom_http_request_seconds_sum', labels] += elapsed
+            self.totals['hom_http_request_seconds_count', labels] += 1
+            self.totals['hom_db_queries_total', labels] += stats.queries
+            self.totals['hom_db_query_seconds_sum', labels] += stats.db_time
+            self.totals['hom_template_render_seconds_sum', labels] += stats.template_time
+            self.totals['hom_n_plus_one_total', labels] += len(repeated)
+
+    # Export
+    def metrics(self):
+        """Prometheus text exposition of this process's totals."""
+        lines = []
+        with self.lock:
+            totals = sorted(self.totals.items())
+        for (name, labels), value in totals:
+            if not lines or not lines[-1].startswith(name + '{'):
+                lines.append('# TYPE {} {}'.format(name, 'untyped' if name.endswith(('_sum', '_count')) else 'counter'))
+            lines.append('{}{} {}'.format(name, format_labels(labels), format_value(value)))
+        for name, label, counter, help_text in self.counters:
+            if help_text:
+                lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} counter'.format(name))
+            for key, value in sorted(counter.items()):
+                lines.append('{}{} {}'.format(name, format_labels(((label, key),)), format_value(value)))
+        return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def format_labels(labels):
+    escaped = ('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,64 @@
+"""Interval index over closed [start, end] ranges, used for lease occupancy."""
+import bisect
+import datetime
+
+
+OPEN_END = datetime.datetime.max    # stands in for a missing end date
+
+
+class IntervalIndex(object):
+    """
+    Intervals sorted by start, with `reach[i]` the furthest end among the first i + 1 of them.
+    A query bisects on the starts and walks back only while `reach` can still cover it, so lookups cost
+    O(log n + k) when the intervals don't overlap each other (one lease at a time per property),
+    and never look past the last gap before the query.
+    """
+
+    def __init__(self, intervals=()):
+        items = sorted(((start, OPEN_END if end is None else end, value) for start, end, value in intervals),
+                       key=lambda item: (item[0], item[1]))
+        self.starts = [start for start, _, _ in items]
+        self.ends = [end for _, end, _ in items]
+        self.values = [value for _, _, value in items]
+        self.reach = []
+        self.extend_reach(0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def extend_reach(self, i):
+        del self.reach[i:]
+        furthest = self.reach[i - 1] if i else None
+        for end in self.ends[i:]:
+            furthest = end if furthest is None or end > furthest else furthest
+            self.reach.append(furthest)
+
+    def add(self, start, end, value):
+        """Insert one interval; O(n) for the list shift, which is fine at lease volumes per property."""
+        end = OPEN_END if end is None else end
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.values.insert(i, value)
+        self.extend_reach(i)
+
+    def overlapping(self, start, end=None):
+        """Values of every interval sharing at least one instant with [start, end], ordered by start."""
+        end = OPEN_END if end is None else end
+        found = []
+        i = bisect.bisect_right(self.starts, end) - 1
+        while i >= 0 and self.reach[i] >= start:
+            if self.ends[i] >= start:
+                found.append(self.values[i])
+            i -= 1
+        found.reverse()
+        return found
+
+    def at(self, point):
+        """Values of the intervals containing `point`."""
+        return self.overlapping(point, point)
+
+    def latest_at(self, point):
+        """The latest-starting interval containing `point`, or None."""
+        found = self.at(point)
+        return found[-1] if found else None
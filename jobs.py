@@ -0,0 +1,193 @@
+"""Background jobs: a queue kept in the app's own database and a pool of worker processes.
+
+Requests `enqueue` work and return straight away; `flask jobs-worker` claims queued jobs,
+runs the registered task and retries failures with exponential backoff. A running job holds a lock
+that its worker keeps extending; if the worker dies the lock lapses and another worker takes the job.
+"""
+import datetime
+import json
+import multiprocessing
+import threading
+import time
+import traceback
+import click
+from flask import current_app
+from sqlalchemy import and_, or_
+from . import db, blob_store, thumbnailer
+from .models.job import Job
+
+
+RETRY_DELAY = 30        # seconds before the first retry, doubled on each further attempt
+POLL_INTERVAL = 1.0     # seconds an idle worker sleeps between polls
+LOCK_TIMEOUT = 300      # seconds without a heartbeat before a running job counts as abandoned
+
+TASKS = {}
+
+
+def task(kind):
+    """Register a function as the handler for jobs of `kind`."""
+    def register(func):
+        TASKS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, owner_id=None, max_attempts=3):
+    """
+    Queue a job in the current transaction, it becomes visible to workers when the caller commits.
+    `payload` holds the task's keyword arguments, `owner_id` is the user allowed to see its status.
+    """
+    job = Job(kind=kind, payload=json.dumps(payload or {}), user_id=owner_id, max_attempts=max_attempts)
+    db.session.add(job)
+    return job
+
+
+def claimable(now):
+    """Queued jobs that are due, and running jobs whose worker stopped sending heartbeats."""
+    return or_(and_(Job.status == Job.QUEUED, Job.run_after <= now),
+               and_(Job.status == Job.RUNNING, Job.locked_until < now))
+
+
+def claim():
+    """Atomically take the oldest runnable job; returns None when the queue is empty."""
+    while True:
+        now = datetime.datetime.utcnow()
+        candidate = db.session.query(Job.id).filter(claimable(now)) \
+                              .order_by(Job.run_after, Job.id).limit(1).scalar()
+        if candidate is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(
+            Job.__table__.update()
+               .where(Job.id == candidate).where(claimable(now))
+               .values(status=Job.RUNNING, attempts=Job.attempts + 1, updated_on=now,
+                       locked_until=now + datetime.timedelta(seconds=LOCK_TIMEOUT))
+        ).rowcount
+        db.session.commit()
+        if not claimed:     # another worker got there first
+            continue
+        job = Job.query.get(candidate)
+        if job.attempts > job.max_attempts:     # abandoned on its last attempt
+            job.status, job.locked_until = Job.FAILED, None
+            job.error = 'Worker stopped while running the last attempt'
+            db.session.commit()
+            continue
+        return job
+
+
+class Heartbeat(threading.Thread):
+    """Pushes a running job's lock forward from a side thread, on its own connection, until stopped."""
+
+    def __init__(self, engine, job_id):
+        super(Heartbeat, self).__init__(daemon=True)
+        self.engine = engine
+        self.job_id = job_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(LOCK_TIMEOUT / 3):
+            with self.engine.begin() as connection:
+                connection.execute(
+                    Job.__table__.update()
+                       .where(Job.id == self.job_id).where(Job.status == Job.RUNNING)
+                       .values(locked_until=datetime.datetime.utcnow() + datetime.timedelta(seconds=LOCK_TIMEOUT))
+                )
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(job):
+    """Run one claimed job and record its result, or requeue it with backoff if attempts remain."""
+    heartbeat = Heartbeat(db.engine, job.id)
+    heartbeat.start()
+    try:
+        result = TASKS[job.kind](**json.loads(job.payload))
+    except Exception:
+        db.session.rollback()
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = datetime.datetime.utcnow() + datetime.timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.FAILED
+        current_app.logger.warning('Job %s (%s) failed, attempt %s', job.id, job.kind, job.attempts)
+    else:
+        job.status = Job.DONE
+        job.result = json.dumps(result)
+        job.error = None
+    finally:
+        heartbeat.stop()
+    job.locked_until = None
+    db.session.commit()
+
+
+def work(config, profile=None, poll_interval=POLL_INTERVAL, burst=False):
+    """
+    Worker loop: claim and run jobs until stopped, or until the queue is empty with `burst`.
+    Each worker process builds its own app from `config` and `profile`, as `create_app` takes them.
+    """
+    from . import create_app
+    app = create_app(config, profile)
+    with app.app_context():
+        db.engine.dispose()     # never share pooled connections with the parent process
+    while True:
+        # A fresh app context per job, so `g` memos and the session (with its info markers) never carry over
+        with app.app_context():
+            job = claim()
+            if job is not None:
+                run(job)
+                continue
+        if burst:
+            return
+        time.sleep(poll_interval)
+
+
+@click.command('jobs-worker')
+@click.option('--processes', default=2, show_default=True, help='Worker processes to start.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+@click.option('--config', default='config.Config', show_default=True, help='Config import path for the workers.')
+@click.option('--profile', default=None, help='Deployment profile for the workers (default: HOM_PROFILE).')
+def worker_command(processes, burst, config, profile):
+    """Run background jobs in a pool of worker processes."""
+    workers = [multiprocessing.Process(target=work, args=(config, profile, POLL_INTERVAL, burst))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+"""Tasks"""
+@task('thumbnail')
+def render_thumbnail(digest):
+    if thumbnailer.available:
+        thumbnailer.render(digest)
+
+
+@task('import')
+def import_file(kind, digest, fmt, user_id):
+    from .importer import import_rows, read_rows
+    with open(blob_store.path(digest), 'rb') as file:
+        return import_rows(kind, read_rows(file, fmt), user_id)
+
+
+@task('rebuild_analytics')
+def rebuild_analytics(user_id=None):
+    from .analytics import rebuild
+    rebuild(user_id)
+
+
+@task('snapshot_portfolios')
+def snapshot_portfolios(user_id=None):
+    from .snapshots import take_missing
+    return {'taken': take_missing(user_id)}
+
+
+@task('post_charges')
+def post_charges(user_id=None):
+    from .ledger import post_due_charges
+    posted = post_due_charges(user_id=user_id)
+    db.session.commit()
+    return {'posted': posted}
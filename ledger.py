@@ -0,0 +1,85 @@
+"""Running balances per renter and lease, updated in the same transaction as the rows that move them.
+
+A balance is posted charges minus payments. Payments apply the moment they are inserted, amended
+or deleted. Scheduled charges are posted once their due date arrives (`post_due_charges`).
+Every change is an atomic `balance = balance + delta` UPDATE, so concurrent writers never lose one.
+"""
+import datetime
+import click
+from sqlalchemy import event, func, inspect
+from . import db
+from .models.charge import Charge
+from .models.lease import Lease
+from .models.payment import Payment
+from .models.renter import Renter
+from .fragments import mark_changed
+
+
+def adjust(connection, renter_id, lease_id, delta):
+    """Add `delta` to a renter's balance and, for lease payments, to the lease's balance."""
+    if not delta:
+        return
+    for table, id_ in ((Renter.__table__, renter_id), (Lease.__table__, lease_id)):
+        if id_ is not None:
+            connection.execute(table.update().where(table.c.id == id_).values(balance=table.c.balance + delta))
+
+
+def previous(payment, attr):
+    history = inspect(payment).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(payment, attr)
+
+
+@event.listens_for(Payment, 'after_insert')
+def apply_payment(mapper, connection, payment):
+    adjust(connection, payment.renter_id, payment.lease_id, -float(payment.amount))
+
+
+@event.listens_for(Payment, 'after_update')
+def amend_payment(mapper, connection, payment):
+    old = [previous(payment, attr) for attr in ('renter_id', 'lease_id', 'amount')]
+    if old == [payment.renter_id, payment.lease_id, payment.amount]:
+        return
+    adjust(connection, old[0], old[1], float(old[2] or 0))
+    adjust(connection, payment.renter_id, payment.lease_id, -float(payment.amount))
+
+
+@event.listens_for(Payment, 'after_delete')
+def reverse_payment(mapper, connection, payment):
+    adjust(connection, payment.renter_id, payment.lease_id, float(payment.amount))
+
+
+def post_due_charges(as_of=None, user_id=None):
+    """
+    Post every charge due by `as_of` (default: now) onto its renter and lease balances; returns how many.
+    Charges are claimed with a single UPDATE first, so concurrent posters never post one twice.
+    The caller commits.
+    """
+    as_of = as_of or datetime.datetime.utcnow()
+    stamp = datetime.datetime.utcnow()
+    claim = Charge.__table__.update().where(Charge.posted_on == None).where(Charge.due_date <= as_of)
+    if user_id is not None:
+        claim = claim.where(Charge.user_id == user_id)
+    claimed = db.session.execute(claim.values(posted_on=stamp)).rowcount
+    if not claimed:
+        return 0
+
+    connection = db.session.connection()
+    for (user_id,) in db.session.query(Charge.user_id).filter(Charge.posted_on == stamp).distinct():
+        mark_changed(db.session, user_id)
+    for column, table in ((Charge.renter_id, Renter.__table__), (Charge.lease_id, Lease.__table__)):
+        totals = db.session.query(column, func.sum(Charge.amount)) \
+                           .filter(Charge.posted_on == stamp).group_by(column).all()
+        if totals:
+            connection.execute(
+                table.update().where(table.c.id == db.bindparam('target')).values(balance=table.c.balance + db.bindparam('delta')),
+                [{'target': id_, 'delta': total} for id_, total in totals]
+            )
+    return claimed
+
+
+@click.command('post-charges')
+def post_charges_command():
+    """Post every charge that has come due onto renter and lease balances."""
+    posted = post_due_charges()
+    db.session.commit()
+    click.echo('Posted {} charges.'.format(posted))
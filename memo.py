@@ -0,0 +1,37 @@
+"""Request-scoped memoization for model helper methods."""
+import functools
+from flask import g, has_app_context
+
+
+def _store():
+    """Memo table for the current request, or None outside of an app context."""
+    if not has_app_context():
+        return None
+    if '_memo' not in g:
+        g._memo = {}
+    return g._memo
+
+
+def request_memoized(method):
+    """
+    Cache a model helper's result per instance for the rest of the request.
+    Entries are keyed by (model name, primary key) so they can be dropped with `invalidate`.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        store = _store()
+        if store is None or self.id is None:
+            return method(self, *args)
+        entry = store.setdefault((type(self).__name__, self.id), {})
+        key = (method.__name__,) + args
+        if key not in entry:
+            entry[key] = method(self, *args)
+        return entry[key]
+    return wrapper
+
+
+def invalidate(model_name, id_):
+    """Forget every memoized helper result for one instance."""
+    store = _store()
+    if store is not None:
+        store.pop((model_name, id_), None)
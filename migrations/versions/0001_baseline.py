@@ -0,0 +1,100 @@
+"""baseline schema, as created by db.create_all()
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=15), nullable=False),
+        sa.Column('first_name', sa.String(length=50), nullable=False),
+        sa.Column('last_name', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=200), nullable=False),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.Column('last_login', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username'),
+        sa.UniqueConstraint('first_name'),
+        sa.UniqueConstraint('last_name'),
+        sa.UniqueConstraint('email')
+    )
+    op.create_table('addresses',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('street', sa.String(length=200), nullable=False),
+        sa.Column('city', sa.String(length=40), nullable=False),
+        sa.Column('state', sa.String(length=40), nullable=False),
+        sa.Column('zip', sa.Integer(), nullable=False),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('properties',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('image', sa.LargeBinary(), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('address_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['address_id'], ['addresses.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('renters',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_name', sa.String(length=50), nullable=False),
+        sa.Column('last_name', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=200), nullable=False),
+        sa.Column('phone', sa.String(length=200), nullable=False),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('leases',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_date', sa.DateTime(), nullable=False),
+        sa.Column('end_date', sa.DateTime(), nullable=True),
+        sa.Column('rate', sa.Float(), nullable=True),
+        sa.Column('terms', sa.Integer(), nullable=False),
+        sa.Column('property_id', sa.Integer(), nullable=True),
+        sa.Column('renter_id', sa.Integer(), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ),
+        sa.ForeignKeyConstraint(['renter_id'], ['renters.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('payments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('description', sa.String(length=200), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('renter_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=True),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('lease_id', sa.Integer(), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['lease_id'], ['leases.id'], ),
+        sa.ForeignKeyConstraint(['renter_id'], ['renters.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('payments')
+    op.drop_table('leases')
+    op.drop_table('renters')
+    op.drop_table('properties')
+    op.drop_table('addresses')
+    op.drop_table('users')
@@ -0,0 +1,28 @@
+"""property images live in the blob store
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.add_column(sa.Column('image_digest', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('image_size', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.drop_column('image_size')
+        batch_op.drop_column('image_digest')
@@ -0,0 +1,36 @@
+"""indexes for the lease and payment access patterns
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_leases_property_id_start_date', 'leases', ['property_id', 'start_date'])
+    op.create_index('ix_leases_renter_id_start_date', 'leases', ['renter_id', 'start_date'])
+    op.create_index('ix_payments_renter_id_date', 'payments', ['renter_id', 'date'])
+    op.create_index('ix_payments_lease_id_date', 'payments', ['lease_id', 'date'])
+    op.create_index('ix_payments_renter_id_created_on', 'payments', ['renter_id', 'created_on'])
+    op.create_index('ix_properties_user_id', 'properties', ['user_id'])
+    op.create_index('ix_renters_user_id', 'renters', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_renters_user_id', table_name='renters')
+    op.drop_index('ix_properties_user_id', table_name='properties')
+    op.drop_index('ix_payments_renter_id_created_on', table_name='payments')
+    op.drop_index('ix_payments_lease_id_date', table_name='payments')
+    op.drop_index('ix_payments_renter_id_date', table_name='payments')
+    op.drop_index('ix_leases_renter_id_start_date', table_name='leases')
+    op.drop_index('ix_leases_property_id_start_date', table_name='leases')
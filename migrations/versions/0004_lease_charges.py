@@ -0,0 +1,41 @@
+"""scheduled lease charges
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('charges',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('lease_id', sa.Integer(), nullable=False),
+        sa.Column('renter_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('due_date', sa.DateTime(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('description', sa.String(length=200), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['lease_id'], ['leases.id'], ),
+        sa.ForeignKeyConstraint(['renter_id'], ['renters.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_charges_lease_id_due_date', 'charges', ['lease_id', 'due_date'])
+    op.create_index('ix_charges_renter_id_due_date', 'charges', ['renter_id', 'due_date'])
+
+
+def downgrade():
+    op.drop_index('ix_charges_renter_id_due_date', table_name='charges')
+    op.drop_index('ix_charges_lease_id_due_date', table_name='charges')
+    op.drop_table('charges')
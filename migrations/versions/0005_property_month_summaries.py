@@ -0,0 +1,41 @@
+"""precomputed per-property monthly analytics
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('property_months',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.DateTime(), nullable=False),
+        sa.Column('days', sa.Integer(), nullable=False),
+        sa.Column('occupied_days', sa.Integer(), nullable=False),
+        sa.Column('rent_due', sa.Float(), nullable=False),
+        sa.Column('rent_collected', sa.Float(), nullable=False),
+        sa.Column('updated_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('property_id', 'month', name='uq_property_months_property_id_month')
+    )
+    op.create_index('ix_property_months_user_id_month', 'property_months', ['user_id', 'month'])
+    # Existing leases and payments are summarised with `flask rebuild-analytics` after upgrading
+
+
+def downgrade():
+    op.drop_index('ix_property_months_user_id_month', table_name='property_months')
+    op.drop_table('property_months')
@@ -0,0 +1,46 @@
+"""running balances on renters and leases, posted flag on charges
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 09:50:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('renters') as batch_op:
+        batch_op.add_column(sa.Column('balance', sa.Float(), nullable=False, server_default='0'))
+    with op.batch_alter_table('leases') as batch_op:
+        batch_op.add_column(sa.Column('balance', sa.Float(), nullable=False, server_default='0'))
+    with op.batch_alter_table('charges') as batch_op:
+        batch_op.add_column(sa.Column('posted_on', sa.DateTime(), nullable=True))
+    op.create_index('ix_charges_user_id_posted_on_due_date', 'charges', ['user_id', 'posted_on', 'due_date'])
+
+    # Nothing is posted yet, so opening balances are just the payments; `flask post-charges` posts what is due
+    op.execute(
+        "UPDATE renters SET balance = -COALESCE("
+        "(SELECT SUM(amount) FROM payments WHERE payments.renter_id = renters.id), 0)"
+    )
+    op.execute(
+        "UPDATE leases SET balance = -COALESCE("
+        "(SELECT SUM(amount) FROM payments WHERE payments.lease_id = leases.id), 0)"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_charges_user_id_posted_on_due_date', table_name='charges')
+    with op.batch_alter_table('charges') as batch_op:
+        batch_op.drop_column('posted_on')
+    with op.batch_alter_table('leases') as batch_op:
+        batch_op.drop_column('balance')
+    with op.batch_alter_table('renters') as batch_op:
+        batch_op.drop_column('balance')
@@ -0,0 +1,45 @@
+"""search index over renters and property addresses
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 10:20:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+TABLE_DDL = (
+    "CREATE TABLE IF NOT EXISTS search_documents ("
+    "doc_id BIGINT NOT NULL PRIMARY KEY, kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, "
+    "user_id INTEGER, label VARCHAR(400) NOT NULL, body TEXT NOT NULL)"
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, user_id UNINDEXED, label UNINDEXED, body, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(TABLE_DDL)
+        op.execute("CREATE INDEX IF NOT EXISTS ix_search_documents_body_trgm "
+                   "ON search_documents USING gin (body gin_trgm_ops)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_search_documents_user_id ON search_documents (user_id)")
+    else:
+        op.execute(TABLE_DDL)
+    # Existing renters and properties are indexed with `flask rebuild-search` after upgrading
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS search_documents")
@@ -0,0 +1,38 @@
+"""point-in-time portfolio snapshots
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 10:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('portfolio_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.DateTime(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'as_of', name='uq_portfolio_snapshots_user_id_as_of')
+    )
+    op.create_index('ix_charges_user_id_due_date', 'charges', ['user_id', 'due_date'])
+    op.create_index('ix_payments_user_id_date', 'payments', ['user_id', 'date'])
+    # Snapshots are taken by `flask snapshot-portfolios`; until then history queries replay from the start
+
+
+def downgrade():
+    op.drop_index('ix_payments_user_id_date', table_name='payments')
+    op.drop_index('ix_charges_user_id_due_date', table_name='charges')
+    op.drop_table('portfolio_snapshots')
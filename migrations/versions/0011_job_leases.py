@@ -0,0 +1,26 @@
+"""job lock expiry, so jobs of crashed workers are claimed again
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.add_column(sa.Column('locked_until', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_column('locked_until')
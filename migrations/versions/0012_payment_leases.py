@@ -0,0 +1,37 @@
+"""book existing payments to their renter's lease and restate lease balances
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 10:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same rule as models.lease.payment_lease_id: the renter's lease in force that day, latest start first
+    op.execute(
+        "UPDATE payments SET lease_id = ("
+        "SELECT leases.id FROM leases WHERE leases.renter_id = payments.renter_id "
+        "AND leases.start_date <= COALESCE(payments.date, payments.created_on) "
+        "AND (leases.end_date IS NULL OR leases.end_date >= COALESCE(payments.date, payments.created_on)) "
+        "ORDER BY leases.start_date DESC, leases.id DESC LIMIT 1"
+        ") WHERE lease_id IS NULL"
+    )
+    # Lease balances never saw those payments; restate them as posted charges minus payments
+    op.execute(
+        "UPDATE leases SET balance = COALESCE("
+        "(SELECT SUM(amount) FROM charges WHERE charges.lease_id = leases.id AND charges.posted_on IS NOT NULL), 0"
+        ") - COALESCE((SELECT SUM(amount) FROM payments WHERE payments.lease_id = leases.id), 0)"
+    )
+
+
+def downgrade():
+    pass    # the attribution is data, not schema; there is nothing to undo
@@ -0,0 +1,58 @@
+"""Database models."""
+from .. import db
+import datetime
+
+
+class Charge(db.Model):
+    """Model for rent charges scheduled by a lease"""
+
+    __tablename__ = "charges"
+    __table_args__ = (
+        db.Index('ix_charges_lease_id_due_date', 'lease_id', 'due_date'),
+        db.Index('ix_charges_renter_id_due_date', 'renter_id', 'due_date'),
+        db.Index('ix_charges_user_id_posted_on_due_date', 'user_id', 'posted_on', 'due_date'),
+        db.Index('ix_charges_user_id_due_date', 'user_id', 'due_date'),     # point-in-time replay
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    lease_id = db.Column(
+        db.Integer,
+        db.ForeignKey("leases.id"),
+        nullable=False
+    )
+    renter_id = db.Column(  # person who owes the charge
+        db.Integer,
+        db.ForeignKey("renters.id"),
+        nullable=False
+    )
+    user_id = db.Column(    # person getting paid
+        db.Integer,
+        db.ForeignKey("users.id"),
+        nullable=False
+    )
+    due_date = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+    amount = db.Column(
+        db.Float,
+        nullable=False
+    )
+    description = db.Column(
+        db.String(200),
+        nullable=True
+    )
+    posted_on = db.Column(  # set once the charge is added to the renter and lease balances
+        db.DateTime,
+        nullable=True
+    )
+    created_on = db.Column(
+        db.DateTime,
+        default=datetime.datetime.utcnow
+    )
+
+    def __repr__(self):
+        return '<Charge -- due: {}, amount: {}>'.format(self.due_date, self.amount)
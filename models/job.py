@@ -0,0 +1,91 @@
+"""Database models."""
+from .. import db
+import datetime
+import json
+
+
+class Job(db.Model):
+    """Model for queued background jobs"""
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    kind = db.Column(
+        db.String(50),
+        nullable=False
+    )
+    payload = db.Column(    # JSON keyword arguments for the task
+        db.Text,
+        nullable=False,
+        default='{}'
+    )
+    status = db.Column(
+        db.String(20),
+        nullable=False,
+        default='queued'
+    )
+    attempts = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0
+    )
+    max_attempts = db.Column(
+        db.Integer,
+        nullable=False,
+        default=3
+    )
+    run_after = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow
+    )
+    locked_until = db.Column(   # while running, extended by the worker's heartbeat; past it the job is claimable again
+        db.DateTime,
+        nullable=True
+    )
+    result = db.Column(     # JSON return value of the task
+        db.Text,
+        nullable=True
+    )
+    error = db.Column(
+        db.Text,
+        nullable=True
+    )
+    user_id = db.Column(    # account that queued the job, may see its status
+        db.Integer,
+        db.ForeignKey("users.id"),
+        nullable=True
+    )
+    created_on = db.Column(
+        db.DateTime,
+        default=datetime.datetime.utcnow
+    )
+    updated_on = db.Column(
+        db.DateTime,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow
+    )
+
+    """Helper Functions"""
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error.strip().splitlines()[-1] if self.error else None,
+            'created_on': self.created_on.isoformat() if self.created_on else None,
+            'updated_on': self.updated_on.isoformat() if self.updated_on else None,
+        }
+
+    def __repr__(self):
+        return '<Job {} {} {}>'.format(self.id, self.kind, self.status)
@@ -1,15 +1,27 @@
 """Database models."""
 from .. import db
 import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from calendar import monthrange
 from .payment import Payment
-# from dateutil.relativedelta import relativedelta
-from flask_login import current_user
+from .charge import Charge
+from .summary import mark_stale
+from ..memo import invalidate
+from ..intervals import IntervalIndex
+
+
+DELINQUENCY_THRESHOLD = 0.005   # ignore float rounding left over on settled balances
 
 
 class Lease(db.Model):
     """Model for user leases"""
 
     __tablename__ = "leases"
+    __table_args__ = (
+        db.Index('ix_leases_property_id_start_date', 'property_id', 'start_date'),
+        db.Index('ix_leases_renter_id_start_date', 'renter_id', 'start_date'),
+    )
 
     id = db.Column(
         db.Integer,
@@ -30,34 +42,194 @@ class Lease(db.Model):
     )
     property_id = db.Column(db.Integer, db.ForeignKey("properties.id"))
     renter_id = db.Column(db.Integer, db.ForeignKey("renters.id"))
+    balance = db.Column(    # posted charges minus payments, maintained by ledger.py
+        db.Float,
+        nullable=False,
+        default=0,
+        server_default='0'
+    )
     created_on = db.Column(
         db.DateTime, 
         default=datetime.datetime.utcnow
     )
 
-    """Helper funtions
-    def gen_lease_payments(self):
-        date = self.start_date
-        if date.day != 1:
-            #add a prorate thing
-            date.day = 1
-            date = date + relativedelta(months=1)
-        for p in range(self.terms):
-            payment = Payment(
-                user_id = current_user.id
-                renter_id = self.renter_id
-                date = # TODO: this
-                amount = 0
-                lease_id = self.id
-            )
-            db.session.add(payment)
-            db.session.commit()
-"""
+    """Helper funtions"""
+    @property
+    def current_balance(self):
+        return self.balance or 0
+
+    @property
+    def is_delinquent(self):
+        return self.current_balance > DELINQUENCY_THRESHOLD
+
+    def schedule(self):
+        """
+        Due dates and amounts for the whole lease in one pass: a prorated first charge when the lease
+        starts mid-month, monthly charges on the 1st, and a prorated last one for the days of the final
+        month up to `end_date`. Open-ended leases run `terms` months from their start.
+        Returns a list of (due_date, amount, description).
+        """
+        start, end = as_datetime(self.start_date), as_datetime(self.end_date)
+        if end is None:
+            if not self.terms:
+                return []
+            after = add_months(start, self.terms)
+            end = after.replace(day=min(start.day, monthrange(after.year, after.month)[1])) - datetime.timedelta(days=1)
+        if end < start:
+            return []
+        rate = float(self.rate or 0)
+        rows = []
+        due = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if start.day != 1:
+            days = monthrange(start.year, start.month)[1]
+            last = end.day if end < add_months(due, 1) else days
+            rows.append((start, round(rate * (last - start.day + 1) / days, 2), 'Prorated rent'))
+            due = add_months(due, 1)
+
+        while due <= end:
+            days = monthrange(due.year, due.month)[1]
+            if end < due.replace(day=days):
+                rows.append((due, round(rate * end.day / days, 2), 'Prorated rent'))
+                break
+            rows.append((due, rate, 'Rent'))
+            due = add_months(due, 1)
+        return rows
+
+    def gen_lease_payments(self, replace=False):
+        """
+        Write the schedule as Charge rows with a single executemany INSERT in the caller's transaction.
+        `replace=True` regenerates it after the lease is amended. Charges already posted to the balance
+        ledger are kept, only the unposted rest of the schedule is rebuilt.
+        The lease must be flushed so it has an id.
+        """
+        rows = self.charge_rows(self.property.user_id)
+        if replace:
+            Charge.query.filter(Charge.lease_id == self.id, Charge.posted_on == None) \
+                        .delete(synchronize_session=False)
+            last_posted = db.session.query(db.func.max(Charge.due_date)) \
+                                    .filter(Charge.lease_id == self.id, Charge.posted_on != None).scalar()
+            if last_posted is not None:
+                rows = [row for row in rows if row['due_date'] > last_posted]
+        if rows:
+            db.session.execute(Charge.__table__.insert(), rows)
+        # Core inserts skip the ORM flush events, so queue the analytics refresh here
+        mark_stale(db.session, 'lease', self.id, as_datetime(self.start_date), as_datetime(self.end_date))
+        return len(rows)
+
+    def charge_rows(self, user_id):
+        """The schedule as insert parameters for the charges table, so callers can batch several leases."""
+        now = datetime.datetime.utcnow()
+        return [
+            dict(lease_id=self.id, renter_id=self.renter_id, user_id=user_id,
+                 due_date=due_date, amount=amount, description=description, created_on=now)
+            for due_date, amount, description in self.schedule()
+        ]
 
     """SQLAlchemy relationships"""
     payments = db.relationship("Payment", backref="lease")
+    charges = db.relationship("Charge", backref="lease", order_by="Charge.due_date")
     renter = db.relationship("Renter", backref="leases")
 
+    """Query helpers"""
+    @classmethod
+    def current_subquery(cls, partition_by, as_of=None):
+        """
+        Resolve the current lease for every `partition_by` value ('property_id' or 'renter_id') in one query.
+        A lease is current when it has started and not yet ended; the latest start wins if several qualify.
+        Returns a subquery with `lease_id` and the partition column, one row per partition.
+        """
+        as_of = as_of or datetime.datetime.utcnow()
+        partition = getattr(cls, partition_by)
+        ranked = db.session.query(
+            cls.id.label('lease_id'),
+            partition.label(partition_by),
+            db.func.row_number().over(
+                partition_by = partition,
+                order_by = (cls.start_date.desc(), cls.id.desc())
+            ).label('rank')
+        ).filter(
+            cls.start_date <= as_of,
+            db.or_(cls.end_date == None, cls.end_date >= as_of)
+        ).subquery()
+        return db.session.query(ranked.c.lease_id, getattr(ranked.c, partition_by)) \
+                         .filter(ranked.c.rank == 1).subquery()
+
+    @classmethod
+    def current_for(cls, partition_by, id_, loaded=None, as_of=None):
+        """
+        The current lease of one property or renter by the same rule as `current_subquery`.
+        `loaded` is an already loaded lease collection to pick from instead of querying.
+        """
+        as_of = as_of or datetime.datetime.utcnow()
+        if loaded is not None:
+            return IntervalIndex(
+                (as_datetime(lease.start_date), as_datetime(lease.end_date), lease)
+                for lease in sorted(loaded, key=lambda lease: lease.id)
+            ).latest_at(as_of)
+        return cls.query.filter(
+            getattr(cls, partition_by) == id_,
+            cls.start_date <= as_of,
+            db.or_(cls.end_date == None, cls.end_date >= as_of)
+        ).order_by(cls.start_date.desc(), cls.id.desc()).first()
+
     def __repr__(self):
         return '<Lease {} - {}>'.format(self.start_date.month + self.start_date.month, self.end_date.month + self.start_date.year)
 
+
+def as_datetime(value):
+    """Lease dates arrive from the form as dates and come back from the database as datetimes."""
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime(value.year, value.month, value.day)
+
+
+def add_months(date, months):
+    """First of the month `months` after `date`."""
+    month = date.month - 1 + months
+    return date.replace(year=date.year + month // 12, month=month % 12 + 1, day=1)
+
+
+@event.listens_for(Session, 'after_flush')
+def invalidate_lease_helpers(session, flush_context):
+    """Drop memoized Property/Renter lease lookups touched by a lease insert, update or delete."""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Lease):
+            continue
+        state = inspect(obj)
+        for model_name, attr in (('Property', 'property_id'), ('Renter', 'renter_id')):
+            history = state.attrs[attr].history
+            for id_ in set(history.sum()) | {getattr(obj, attr)}:
+                if id_ is not None:
+                    invalidate(model_name, int(id_))    # views may assign the id as a URL or form string
+
+
+def payment_lease_id(connection, renter_id, date):
+    """
+    The lease a payment by `renter_id` on `date` pays towards: the renter's lease in force that day,
+    the latest start winning as in `current_for`. None for payments outside every lease (deposits).
+    """
+    if renter_id is None:
+        return None
+    date = as_datetime(date) or datetime.datetime.utcnow()
+    table = Lease.__table__
+    return connection.execute(
+        db.select([table.c.id]).where(table.c.renter_id == int(renter_id))
+          .where(table.c.start_date <= date)
+          .where(db.or_(table.c.end_date == None, table.c.end_date >= date))
+          .order_by(table.c.start_date.desc(), table.c.id.desc()).limit(1)
+    ).scalar()
+
+
+@event.listens_for(Payment, 'before_insert')
+def attribute_new_payment(mapper, connection, payment):
+    """Payments recorded against a renter are booked to their lease, so lease balances and rent totals see them."""
+    if payment.lease_id is None:
+        payment.lease_id = payment_lease_id(connection, payment.renter_id, payment.date)
+
+
+@event.listens_for(Payment, 'before_update')
+def reattribute_payment(mapper, connection, payment):
+    state = inspect(payment)
+    moved = state.attrs.renter_id.history.has_changes() or state.attrs.date.history.has_changes()
+    if moved and not state.attrs.lease_id.history.has_changes():
+        payment.lease_id = payment_lease_id(connection, payment.renter_id, payment.date)
@@ -7,6 +7,12 @@ class Payment(db.Model):
     """Model for user payments"""
      
     __tablename__ = "payments"
+    __table_args__ = (
+        db.Index('ix_payments_renter_id_date', 'renter_id', 'date'),
+        db.Index('ix_payments_lease_id_date', 'lease_id', 'date'),
+        db.Index('ix_payments_renter_id_created_on', 'renter_id', 'created_on'),    # payment history paging
+        db.Index('ix_payments_user_id_date', 'user_id', 'date'),     # point-in-time replay
+    )
 
     id = db.Column(
         db.Integer,
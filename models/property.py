@@ -1,6 +1,8 @@
 from .. import db
 import datetime
+from sqlalchemy import inspect
 from .lease import Lease
+from ..memo import request_memoized
 
 class Property(db.Model):
     """Model for properties."""
@@ -11,18 +13,25 @@ class Property(db.Model):
         db.Integer,
         primary_key=True
     )
-    image = db.Column(
+    image = db.deferred(db.Column(    # legacy inline image, moved to the blob store on first request
         db.LargeBinary,
         nullable = True
+    ))
+    image_digest = db.Column(   # sha256 of the image in the blob store
+        db.String(64),
+        nullable = True
+    )
+    image_size = db.Column(
+        db.Integer,
+        nullable = True
     )
     created_on = db.Column(
         db.DateTime, 
         default=datetime.datetime.utcnow
     )
     """Foreign Keys"""
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     address_id = db.Column(db.Integer, db.ForeignKey("addresses.id"))
-    # TODO: put image of property here
     # TODO: consider adding cost to owner. enabled profit, etc.
 
 
@@ -30,13 +39,24 @@ class Property(db.Model):
     leases = db.relationship("Lease", backref="property")
 
     """Helper Funtions"""
+    @request_memoized
     def most_recent_lease(self):
-        return Lease.query.filter_by(property_id=self.id).order_by('start_date').first()
-
+        """The lease that started last, current or not."""
+        if 'leases' not in inspect(self).unloaded:     # eager-loaded, pick it from the collection
+            return max(self.leases, key=lambda lease: (lease.start_date, lease.id), default=None)
+        return Lease.query.filter_by(property_id=self.id).order_by(Lease.start_date.desc(), Lease.id.desc()).first()
+
+    def has_image(self):
+        """True with a stored image or a legacy inline one still waiting to move; never loads the bytes."""
+        if self.image_digest is not None:
+            return True
+        return bool(db.session.query(Property.image != None).filter(Property.id == self.id).scalar())
+
+    @request_memoized
     def current_lease(self):
-        if not self.most_recent_lease() or datetime.datetime.utcnow() > self.most_recent_lease().end_date:
-            return None
-        return self.most_recent_lease()
+        """The lease running today, the latest start if several are."""
+        loaded = self.leases if 'leases' not in inspect(self).unloaded else None
+        return Lease.current_for('property_id', self.id, loaded)
 
     def __repr__(self):
         return '<{}>'.format(self.address.street)
\ No newline at end of file
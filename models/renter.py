@@ -1,61 +1,84 @@
 """Database models."""
 from .. import db
 import datetime
-from .lease import Lease
-from .property import Property
+from sqlalchemy import inspect
+from .lease import Lease, DELINQUENCY_THRESHOLD
+from ..memo import request_memoized
 
 
 class Renter(db.Model):
     """Model for user renters"""
 
-        __tablename__ = "renters"
-
-        id = db.Column(
-            db.Integer,
-            primary_key=True
-        )
-        first_name = db.Column(
-            db.String(50),
-            nullable=False
-        )
-        last_name = db.Column(
-            db.String(50),
-            nullable=False
-        )
-        email = db.Column(
-            db.String(200),
-            nullable=False
-        )
-        phone = db.Column(
-            db.String(200),
-            nullable=False
-        )
-        created_on = db.Column(
-            db.DateTime,
-            default=datetime.datetime.utcnow
-        )
+    __tablename__ = "renters"
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    first_name = db.Column(
+        db.String(50),
+        nullable=False
+    )
+    last_name = db.Column(
+        db.String(50),
+        nullable=False
+    )
+    email = db.Column(
+        db.String(200),
+        nullable=False
+    )
+    phone = db.Column(
+        db.String(200),
+        nullable=False
+    )
+    created_on = db.Column(
+        db.DateTime,
+        default=datetime.datetime.utcnow
+    )
+    balance = db.Column(    # posted charges minus payments, maintained by ledger.py
+        db.Float,
+        nullable=False,
+        default=0,
+        server_default='0'
+    )
     """Foreign Keys"""
-        user_id = db.Column(
-            db.Integer,
-            db.ForeignKey("users.id")
-        )
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id"),
+        index=True
+    )
 
     """Helper Functions"""
-        def most_recent_lease(self):
-            return Lease.query.filter_by(renter_id=self.id).order_by('start_date').first()
+    @property
+    def current_balance(self):
+        return self.balance or 0
+
+    @property
+    def is_delinquent(self):
+        return self.current_balance > DELINQUENCY_THRESHOLD
+
+    @request_memoized
+    def most_recent_lease(self):
+        """The lease that started last, current or not."""
+        if 'leases' not in inspect(self).unloaded:     # eager-loaded, pick it from the collection
+            return max(self.leases, key=lambda lease: (lease.start_date, lease.id), default=None)
+        return Lease.query.filter_by(renter_id=self.id).order_by(Lease.start_date.desc(), Lease.id.desc()).first()
 
-        def current_lease(self):
-            if not self.most_recent_lease() or datetime.datetime.utcnow() > self.most_recent_lease().end_date:
-                return None
-            return self.most_recent_lease()
+    @request_memoized
+    def current_lease(self):
+        """The lease running today, the latest start if several are."""
+        loaded = self.leases if 'leases' not in inspect(self).unloaded else None
+        return Lease.current_for('renter_id', self.id, loaded)
 
-        def current_address(self):
-            if not self.current_lease():
-                return None
-            return Property.query.filter_by(id = self.current_lease().property_id).first()
+    @request_memoized
+    def current_address(self):
+        lease = self.current_lease()
+        if not lease:
+            return None
+        return lease.property
 
     """SQLAlchemy relationships"""
-        payments = db.relationship("Payment", backref="renter")
+    payments = db.relationship("Payment", backref="renter")
 
-        def __repr__(self):
-            return '<Renter {}>'.format(self.first_name)
+    def __repr__(self):
+        return '<Renter {}>'.format(self.first_name)
@@ -0,0 +1,51 @@
+"""Database models."""
+from .. import db
+import datetime
+import json
+import zlib
+
+
+class PortfolioSnapshot(db.Model):
+    """Every lease's and renter's balance for one user at the instant `as_of`, compressed JSON"""
+
+    __tablename__ = "portfolio_snapshots"
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'as_of', name='uq_portfolio_snapshots_user_id_as_of'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id"),
+        nullable=False
+    )
+    as_of = db.Column(      # covers charges due and payments dated before this instant
+        db.DateTime,
+        nullable=False
+    )
+    data = db.Column(
+        db.LargeBinary,
+        nullable=False
+    )
+    created_on = db.Column(
+        db.DateTime,
+        default=datetime.datetime.utcnow
+    )
+
+    """Helper functions"""
+    @staticmethod
+    def pack(leases, renters):
+        """`leases` maps lease id to balance, `renters` renter id to payments made outside any lease."""
+        payload = {'leases': leases, 'renters': renters}
+        return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+    def unpack(self):
+        payload = json.loads(zlib.decompress(self.data).decode('utf-8'))
+        return ({int(k): v for k, v in payload['leases'].items()},
+                {int(k): v for k, v in payload['renters'].items()})
+
+    def __repr__(self):
+        return '<PortfolioSnapshot {} {}>'.format(self.user_id, self.as_of)
@@ -0,0 +1,93 @@
+"""Database models."""
+from .. import db
+import datetime
+
+
+class PropertyMonth(db.Model):
+    """Precomputed occupancy and rent totals for one property in one month"""
+
+    __tablename__ = "property_months"
+    __table_args__ = (
+        db.UniqueConstraint('property_id', 'month', name='uq_property_months_property_id_month'),
+        db.Index('ix_property_months_user_id_month', 'user_id', 'month'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    property_id = db.Column(
+        db.Integer,
+        db.ForeignKey("properties.id"),
+        nullable=False
+    )
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id"),
+        nullable=False
+    )
+    month = db.Column(      # first day of the month
+        db.DateTime,
+        nullable=False
+    )
+    days = db.Column(
+        db.Integer,
+        nullable=False
+    )
+    occupied_days = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0
+    )
+    rent_due = db.Column(
+        db.Float,
+        nullable=False,
+        default=0
+    )
+    rent_collected = db.Column(
+        db.Float,
+        nullable=False,
+        default=0
+    )
+    updated_on = db.Column(
+        db.DateTime,
+        default=datetime.datetime.utcnow
+    )
+
+    """Helper Functions"""
+    @property
+    def vacancy_days(self):
+        return self.days - self.occupied_days
+
+    @property
+    def occupancy_rate(self):
+        return self.occupied_days / self.days if self.days else 0
+
+    @property
+    def delinquent(self):
+        return max(self.rent_due - self.rent_collected, 0)
+
+    def __repr__(self):
+        return '<PropertyMonth {} {:%Y-%m}>'.format(self.property_id, self.month)
+
+
+def month_start(date):
+    return datetime.datetime(date.year, date.month, 1)
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def mark_stale(session, kind, id_, start, end=None):
+    """
+    Queue the months from `start` to `end` (default: this month) of a 'property' or 'lease' for a summary refresh.
+    The queue lives on the session and is drained before the transaction commits.
+    """
+    if id_ is None or start is None:
+        return
+    stale = session.info.setdefault('stale_months', set())
+    month, last = month_start(start), month_start(end or datetime.datetime.utcnow())
+    while month <= last:
+        stale.add((kind, id_, month))
+        month = next_month(month)
@@ -1,7 +1,130 @@
 from .. import db
 import datetime
+import hashlib
+import hmac
+import os
+import secrets
+import string
+import threading
+import time
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import make_transient_to_detached
+try:
+    import argon2
+except ImportError:     # argon2 hashing is optional
+    argon2 = None
+
+
+class PasswordHasher(object):
+    """
+    Hashes passwords with the method set in PASSWORD_HASH_METHOD:
+    'scrypt:N:r:p', 'pbkdf2:sha256:iterations' or 'argon2:time_cost:memory_kib:parallelism'.
+    scrypt and pbkdf2 hashes use werkzeug's 'method$salt$hash' format, so either side can verify them.
+    Hashes run on the calling thread. PASSWORD_HASH_CONCURRENCY (default: CPU count) caps how many run at
+    once per process; further logins wait their turn, so a burst of them can't starve every other request
+    of CPU.
+    """
+
+    DEFAULT_METHOD = 'scrypt:32768:8:1'
+    SALT_CHARS = string.ascii_letters + string.digits
+
+    def __init__(self, app=None):
+        self.method = self.DEFAULT_METHOD
+        self.slots = None
+        self._dummy = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.DEFAULT_METHOD)
+        self._dummy = None
+        self.slots = threading.BoundedSemaphore(app.config.get('PASSWORD_HASH_CONCURRENCY', os.cpu_count() or 2))
+
+    def hash(self, password, method=None):
+        return self._run(self._hash, password, method or self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(self._verify, pwhash, password)
+
+    def dummy_verify(self, password):
+        """Spend the same time as a real check, so unknown emails can't be told apart by latency."""
+        if self._dummy is None:
+            self._dummy = self._hash(secrets.token_urlsafe(16), self.method)
+        self.verify(self._dummy, password)
+        return False
+
+    def needs_rehash(self, pwhash):
+        """True when `pwhash` was made with a different method or cost than the configured one."""
+        if pwhash.startswith('$argon2'):
+            if not self.method.startswith('argon2') or argon2 is None:
+                return True
+            return self._argon2(self.method).check_needs_rehash(pwhash)
+        return pwhash.split('$', 1)[0] != self.method
+
+    def _run(self, func, *args):
+        if self.slots is None:
+            return func(*args)
+        with self.slots:
+            return func(*args)
+
+    def _hash(self, password, method):
+        if method.startswith('argon2'):
+            return self._argon2(method).hash(password)
+        salt = ''.join(secrets.choice(self.SALT_CHARS) for _ in range(16))
+        return '{}${}${}'.format(method, salt, self._derive(method, salt, password))
+
+    def _verify(self, pwhash, password):
+        if pwhash.startswith('$argon2'):
+            try:
+                return argon2 is not None and argon2.PasswordHasher().verify(pwhash, password)
+            except argon2.exceptions.VerificationError:
+                return False
+        try:
+            method, salt, expected = pwhash.split('$', 2)
+            return hmac.compare_digest(self._derive(method, salt, password), expected)
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _derive(method, salt, password):
+        password, salt = password.encode('utf-8'), salt.encode('utf-8')
+        name, *params = method.split(':')
+        if name == 'scrypt':
+            n, r, p = (int(v) for v in params)
+            return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=132 * n * r * p).hex()
+        if name == 'pbkdf2':
+            return hashlib.pbkdf2_hmac(params[0], password, salt, int(params[1])).hex()
+        if not params:  # legacy 'sha256$salt$hash' from werkzeug's old salted HMAC methods
+            return hmac.new(salt, password, name).hexdigest()
+        raise ValueError('Unsupported password hash method {}'.format(method))
+
+    @staticmethod
+    def _argon2(method):
+        if argon2 is None:
+            raise ValueError('argon2 hashing needs the argon2-cffi package')
+        time_cost, memory_cost, parallelism = (int(v) for v in method.split(':')[1:])
+        return argon2.PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+    def calibrate(self, scheme, target_ms):
+        """Cheapest method string of `scheme` whose hash takes at least `target_ms` on this machine."""
+        def timed(method):
+            started = time.perf_counter()
+            self._hash('calibration password', method)
+            return (time.perf_counter() - started) * 1000
+
+        if scheme == 'pbkdf2':
+            iterations = 100000
+            elapsed = timed('pbkdf2:sha256:{}'.format(iterations))
+            return 'pbkdf2:sha256:{}'.format(max(iterations, int(iterations * target_ms / elapsed)))
+        for exponent in range(14, 23):
+            method = 'scrypt:{}:8:1'.format(2 ** exponent) if scheme == 'scrypt' \
+                     else 'argon2:{}:65536:4'.format(exponent - 12)
+            if timed(method) >= target_ms:
+                return method
+        return method
+
+
+hasher = PasswordHasher()
 
 
 class User(UserMixin, db.Model):
@@ -46,15 +169,37 @@ class User(UserMixin, db.Model):
         unique = False,
         nullable = True
     )
+    data_version = db.Column(   # bumped by fragments.py whenever this user's data changes
+        db.Integer,
+        nullable = False,
+        default = 0,
+        server_default = '0'
+    )
 
     """Helper functions"""
     def set_password(self, password):
         """Create hashed password."""
-        self.password = generate_password_hash(password, method='sha256')
+        self.password = hasher.hash(password)
 
     def check_password(self, password):
         """Check hashed password."""
-        return check_password_hash(self.password, password)
+        return hasher.verify(self.password, password)
+
+    def password_needs_rehash(self):
+        """True when the stored hash predates the configured method or cost."""
+        return hasher.needs_rehash(self.password)
+
+    def cache_state(self):
+        """Column values for the identity cache, the password hash never leaves the database."""
+        return {c.key: getattr(self, c.key) for c in self.__table__.columns
+                if c.key not in ('password', 'data_version')}    # the version is always read fresh
+
+    @classmethod
+    def from_cache_state(cls, state):
+        """Attach a cached user to the session without a query, anything not cached loads on access."""
+        user = cls(**state)
+        make_transient_to_detached(user)    # merge(load=False) only accepts detached instances
+        return db.session.merge(user, load=False)
 
     def __repr__(self):
         return '<User {}>'.format(self.username)
\ No newline at end of file
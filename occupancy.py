@@ -0,0 +1,67 @@
+"""
+Lease occupancy per property, from one query over the leases table.
+
+    index = OccupancyIndex.load(user_id=current_user.id)
+    index.occupant(property_id, date)       # (lease_id, renter_id) occupying it that day, or None
+    index.vacant(start, end)                # property ids with no lease anywhere in [start, end]
+    index.overlaps(property_id, start, end) # lease ids a new lease would collide with
+"""
+from . import db
+from .intervals import IntervalIndex
+from .models.lease import Lease, as_datetime
+from .models.property import Property
+
+
+CHUNK_SIZE = 500    # properties per IN (...) list
+
+
+class OccupancyIndex(object):
+    """An IntervalIndex of (lease_id, renter_id) per property. Lease dates are inclusive."""
+
+    def __init__(self, property_ids=()):
+        self.properties = {property_id: IntervalIndex() for property_id in property_ids}
+
+    @classmethod
+    def load(cls, property_ids=None, user_id=None):
+        """Index the leases of `property_ids`, or of every property `user_id` owns (vacant ones included)."""
+        if property_ids is None:
+            property_ids = [id_ for id_, in db.session.query(Property.id).filter(Property.user_id == user_id)]
+        property_ids = sorted(set(property_ids))
+        rows = {}
+        for start in range(0, len(property_ids), CHUNK_SIZE):
+            chunk = property_ids[start:start + CHUNK_SIZE]
+            query = db.session.query(Lease.property_id, Lease.start_date, Lease.end_date, Lease.id, Lease.renter_id) \
+                              .filter(Lease.property_id.in_(chunk))
+            for property_id, start_date, end_date, lease_id, renter_id in query:
+                rows.setdefault(property_id, []).append((start_date, end_date, (lease_id, renter_id)))
+        index = cls()
+        index.properties = {property_id: IntervalIndex(rows.get(property_id, ())) for property_id in property_ids}
+        return index
+
+    def intervals(self, property_id):
+        return self.properties.setdefault(property_id, IntervalIndex())
+
+    def occupant(self, property_id, date):
+        """(lease_id, renter_id) of the lease covering `date`; the latest start wins, as in Lease.current_subquery."""
+        return self.intervals(property_id).latest_at(as_datetime(date))
+
+    def overlaps(self, property_id, start, end=None):
+        """Lease ids on `property_id` sharing a day with [start, end]; an open end runs forever."""
+        return [lease_id for lease_id, _ in
+                self.intervals(property_id).overlapping(as_datetime(start), as_datetime(end))]
+
+    def vacant(self, start, end=None):
+        """Ids of the indexed properties with no lease touching [start, end]."""
+        start, end = as_datetime(start), as_datetime(end)
+        return [property_id for property_id, intervals in sorted(self.properties.items())
+                if not intervals.overlapping(start, end)]
+
+    def leases(self):
+        """Every indexed (lease_id, renter_id)."""
+        for intervals in self.properties.values():
+            for value in intervals.values:
+                yield value
+
+    def add(self, property_id, start, end, value):
+        """Record a lease accepted during this request or import, so later checks see it."""
+        self.intervals(property_id).add(as_datetime(start), as_datetime(end), value)
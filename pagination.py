@@ -0,0 +1,92 @@
+"""Keyset (seek) pagination for listing views."""
+import base64
+import datetime
+import json
+from flask import request
+from sqlalchemy import and_, or_
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token is malformed or was issued for a different sort."""
+
+
+class KeysetPage(object):
+    """One page of rows plus the cursor that continues after its last row (None on the last page)."""
+
+    def __init__(self, items, next_cursor, sort, descending):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.sort = sort
+        self.descending = descending
+
+
+def encode_cursor(sort, descending, values):
+    payload = [sort, descending] + [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort, descending, columns):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        cursor_sort, cursor_descending, values = payload[0], payload[1], payload[2:]
+        if (cursor_sort, cursor_descending) != (sort, descending) or len(values) != len(columns):
+            raise InvalidCursor(token)
+        return [
+            datetime.datetime.fromisoformat(v) if v is not None and column.type.python_type is datetime.datetime else v
+            for v, column in zip(values, columns)
+        ]
+    except (ValueError, TypeError, IndexError, NotImplementedError):
+        raise InvalidCursor(token)
+
+
+def page_args(sort_columns, default_sort):
+    """Read (sort, descending, cursor, limit) from the query string, falling back to `default_sort`."""
+    sort = request.args.get('sort', default_sort)
+    if sort not in sort_columns:
+        sort = default_sort
+    descending = request.args.get('order', 'asc') == 'desc'
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    return sort, descending, request.args.get('cursor'), limit
+
+
+def paginate(query, sort_columns, id_column, key, default_sort, default_order='asc'):
+    """
+    Seek `query` past the request's cursor on (sort column, id) and fetch one page.
+    `sort_columns` maps sort names to columns, `key(row)` returns a row's (sort value, id).
+    Raises InvalidCursor for tokens that do not belong to this sort.
+    """
+    sort, descending, cursor, limit = page_args(sort_columns, default_sort)
+    if 'order' not in request.args:
+        descending = default_order == 'desc'
+    column = sort_columns[sort]
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort, descending, (column, id_column))
+        query = query.filter(seek(column, id_column, value, last_id, descending))
+    order = (column.desc(), id_column.desc()) if descending else (column.asc(), id_column.asc())
+    if nullable(column):
+        order = (order[0].nulls_last(), order[1])
+    rows = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = encode_cursor(sort, descending, key(rows[limit - 1], sort)) if len(rows) > limit else None
+    return KeysetPage(rows[:limit], next_cursor, sort, descending)
+
+
+def nullable(column):
+    return getattr(column.expression, 'nullable', True)
+
+
+def seek(column, id_column, value, last_id, descending):
+    """
+    Rows after (value, last_id) in the page order. NULL sort values come last in either direction:
+    a comparison with NULL is never true, so they need their own branch or they would be skipped.
+    """
+    after_id = id_column < last_id if descending else id_column > last_id
+    if value is None:
+        return and_(column.is_(None), after_id)
+    clause = or_(column < value if descending else column > value, and_(column == value, after_id))
+    if nullable(column):
+        clause = or_(clause, column.is_(None))
+    return clause
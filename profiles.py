@@ -0,0 +1,103 @@
+"""
+Deployment profiles, picked with `create_app(profile=...)` or the HOM_PROFILE environment variable.
+A profile only fills in settings the config left unset.
+
+production:
+- Sizes each worker's connection pool so the whole web tier stays inside DB_MAX_CONNECTIONS.
+- Checks pooled connections before use, recycles them before server-side idle timeouts and keeps
+  a larger compiled statement cache.
+- Turns on WAL and tuned pragmas when the database is SQLite.
+- Never creates tables; run `flask db upgrade` instead.
+- Trusts PROXY_FIX_HOPS (default 1) reverse proxies for the client address, so per-IP login limits see
+  clients rather than the proxy. Set it to 0 when gunicorn faces clients directly.
+"""
+import os
+import sqlite3
+from sqlalchemy import event
+
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',          # readers no longer block the writer, or each other
+    'synchronous': 'NORMAL',        # durable at every checkpoint, safe with WAL
+    'busy_timeout': 5000,           # ms to wait for the write lock before "database is locked"
+    'cache_size': -20000,           # 20 MB page cache per connection
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
+
+
+def production(app):
+    config = app.config
+    config.setdefault('AUTO_CREATE_TABLES', False)
+    config.setdefault('PROXY_FIX_HOPS', int(os.environ.get('PROXY_FIX_HOPS', 1)))
+    config.setdefault('SQLITE_PRAGMAS', SQLITE_PRAGMAS)
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('query_cache_size', 1200)
+    if (config.get('SQLALCHEMY_DATABASE_URI') or '').startswith('sqlite'):
+        options.setdefault('connect_args', {'timeout': 15, 'check_same_thread': False})
+    else:
+        pool_size, max_overflow = pool_budget(config)
+        options.setdefault('pool_size', pool_size)
+        options.setdefault('max_overflow', max_overflow)
+        options.setdefault('pool_timeout', setting(config, 'DB_POOL_TIMEOUT', 10))
+        options.setdefault('pool_recycle', setting(config, 'DB_POOL_RECYCLE', 1800))
+        options.setdefault('pool_pre_ping', True)
+        options.setdefault('pool_use_lifo', True)   # idle extras age out instead of all staying warm
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def pool_budget(config):
+    """
+    (pool_size, max_overflow) for one worker process. Each worker keeps one connection per thread and
+    may borrow up to its share of DB_MAX_CONNECTIONS (default 100) split across WEB_CONCURRENCY workers.
+    DB_POOL_SIZE and DB_MAX_OVERFLOW override the result. Each setting comes from the config, else the
+    environment.
+    """
+    workers = max(setting(config, 'WEB_CONCURRENCY', 1), 1)
+    threads = setting(config, 'GUNICORN_THREADS', 4)
+    share = max(setting(config, 'DB_MAX_CONNECTIONS', 100) // workers, 1)
+    pool_size = setting(config, 'DB_POOL_SIZE', min(threads, share))
+    max_overflow = setting(config, 'DB_MAX_OVERFLOW', max(share - pool_size, 0))
+    return pool_size, max_overflow
+
+
+def setting(config, name, default):
+    """Integer setting from the config, else the environment, else `default`; an explicit 0 is kept."""
+    value = config.get(name)
+    if value is None:
+        value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+PROFILES = {
+    'production': production,
+}
+
+
+def apply(app, name):
+    if name not in PROFILES:
+        raise ValueError('Unknown profile {!r}, expected one of {}'.format(name, ', '.join(PROFILES)))
+    PROFILES[name](app)
+    app.config['PROFILE'] = name
+
+
+def configure_engines(app, db):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection of the app's engines (primary and binds)."""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or {}):
+        engine = db.get_engine(app, bind=bind)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', set_pragmas(pragmas))
+
+
+def set_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
+    return on_connect
@@ -1,10 +1,23 @@
 """Routes for user authentication."""
-from flask import redirect, render_template, flash, Blueprint, request, url_for
+from flask import redirect, render_template, flash, Blueprint, request, url_for, abort, send_file, jsonify
+from flask import Response, stream_with_context
 from flask_login import current_user
 from flask import current_app
 from .forms import LoginForm, SignupForm, PropertyForm, RenterForm, LeaseForm, PaymentForm
 # from .models import db, Property, Address, Renter, User, Lease, Payment
-from . import db
+from . import db, blob_store, thumbnailer
+from .blobstore import BlobTooLarge
+from .pagination import paginate, InvalidCursor
+from .routing import read_replica
+from .importer import IMPORTERS, format_for
+from . import exports
+from . import analytics
+from .ledger import post_due_charges
+from .jobs import enqueue
+from .fragments import cached_page
+from . import search
+from .occupancy import OccupancyIndex
+from .models.job import Job
 from .models.address import Address
 from .models.lease import Lease
 from .models.payment import Payment
@@ -12,7 +25,17 @@ from .models.property import Property
 from .models.renter import Renter
 from .models.user import User
 from .auth import auth_bp
+from sqlalchemy.orm import selectinload
 import binascii
+import click
+import datetime
+import io
+import os
+
+
+MAX_IMAGE_SIZE = 10 * 1024 * 1024     # override with the MAX_IMAGE_SIZE config key
+MAX_IMPORT_SIZE = 50 * 1024 * 1024    # override with the MAX_IMPORT_SIZE config key
+FORM_OVERHEAD = 64 * 1024               # room for the other multipart fields
 
 
 # Blueprint Configuration
@@ -30,6 +53,9 @@ def add_property():
     GET: Serve registration page.
     POST: Validate form, create new property , redirect user to profile.
     """
+    max_image_size = current_app.config.get('MAX_IMAGE_SIZE', MAX_IMAGE_SIZE)
+    if request.content_length and request.content_length > max_image_size + FORM_OVERHEAD:
+        abort(413)  # refuse before the upload is parsed or spooled
     form = PropertyForm()
 
     if form.validate_on_submit():
@@ -38,7 +64,13 @@ def add_property():
             I have chosen to not require uniqueness for addresses to prevent users blocking addresses and confidentiality
             TODO: require unique per user
             """
-            image = None
+            image_digest, image_size = None, None
+            if form.image.data:
+                try:
+                    image_digest, image_size = blob_store.put(form.image.data.stream, max_size=max_image_size)
+                except BlobTooLarge:
+                    form.image.errors.append('Images must be under {} MB.'.format(max_image_size // (1024 * 1024)))
+                    return render_template('add_property.jinja2', title = 'Add a property', form = form)
 
             address = Address(
                 street = form.street.data,
@@ -46,19 +78,16 @@ def add_property():
                 state = form.state.data,
                 zip = form.zip.data,
             )
-            db.session.add(address)
-            db.session.commit()
-
-            if form.image.data:
-                image = convert_to_binary_data(form.image.data)
-
             property_ = Property(
                 user_id = current_user.id,
-                address_id = address.id,
-                image = image
+                address = address,
+                image_digest = image_digest,
+                image_size = image_size
             )
             db.session.add(property_)
-            db.session.commit()
+            if image_digest and thumbnailer.available:
+                enqueue('thumbnail', {'digest': image_digest}, owner_id = current_user.id)
+            db.session.commit()     # address, property and thumbnail job in one transaction
             return redirect(url_for('property_bp.properties'))
         flash("U MUST BE LOGGED IN TO SEE THIS Pge")
         return redirect(url_for('auth_bp.login'))   # Send to login page if not logged in
@@ -72,6 +101,7 @@ def add_property():
 
 
 @property_bp.route('/properties', methods=['GET', 'POST'])
+@cached_page()
 def properties():
     """
     Display Property Properties
@@ -79,22 +109,34 @@ def properties():
     POST: Validate form, create new property property, redirect user to profile.
     """       
     if current_user.is_authenticated:
-        results = Property.query.join(Address, Property.address_id == Address.id) \
-                                .outerjoin(Lease, Property.id == Lease.property_id) \
-                                .outerjoin(Renter, Lease.renter_id == Renter.id) \
-                                .filter(Property.user_id == current_user.id).all()
-
+        page = paged_properties()
         return render_template(
                 'properties.jinja2',
                 title = 'Your property properties',
-                results = results
+                results = page.items,
+                page = page
             )
     flash("U MUST BE LOGGED IN TO SEE THIS Pge")
     return redirect(url_for('auth_bp.login'))
 
 
+@property_bp.route('/properties/page', methods=['GET'])
+@read_replica
+def properties_page():
+    """JSON page of the properties listing, continue with ?cursor=<next_cursor>."""
+    if not current_user.is_authenticated:
+        abort(401)
+    page = paged_properties()
+    return jsonify(
+        items = [property_row_json(row) for row in page.items],
+        next_cursor = page.next_cursor,
+        next_page = next_page_url('property_bp.properties_page', page)
+    )
+
+
 
 @property_bp.route('/property/<property_id>', methods=['GET', 'POST'])
+@cached_page()
 def view_property(property_id):
     if current_user.is_authenticated:
         property_ = Property.query.filter_by(id=property_id).first()
@@ -109,6 +151,37 @@ def view_property(property_id):
     return redirect(url_for('auth_bp.login'))
 
 
+@property_bp.route('/property/<property_id>/image', methods=['GET'])
+def property_image(property_id):
+    """
+    Serve a property's image from the blob store, or its thumbnail with ?size=thumb once rendered.
+    The digest doubles as a strong ETag, so unchanged images answer 304 without touching the disk.
+    """
+    if not current_user.is_authenticated:
+        return redirect(url_for('auth_bp.login'))
+    property_ = Property.query.filter_by(id=property_id, user_id=current_user.id).first()
+    if property_ is None:
+        abort(404)
+    if property_.image_digest is None and not move_image_to_store(property_):
+        abort(404)
+
+    digest = property_.image_digest
+    path, etag = blob_store.path(digest), digest
+    if request.args.get('size') == 'thumb' and os.path.exists(thumbnailer.path(digest)):
+        path, etag = thumbnailer.path(digest), digest + '-thumb'
+
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    elif etag == digest:
+        response = send_file(path, mimetype=blob_store.mimetype(digest), conditional=True)
+    else:
+        response = send_file(path, mimetype='image/jpeg', conditional=True)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = 31536000   # content-addressed, so it never changes under this ETag
+    return response
+
+
 @property_bp.route('/add_renter', methods=['GET', 'POST'])
 def add_renter():
     """
@@ -167,6 +240,16 @@ def add_lease(property_id):
                 I have chosen to not require uniqueness for any of these fields to prevent users blocking addresses
                 TODO: require unique per user (email, phone number)
                 """
+                # Only this property's leases are read, through the (property_id, start_date) index
+                clashes = OccupancyIndex.load([property_.id]).overlaps(property_.id, form.start_date.data, form.end_date.data)
+                if clashes:
+                    form.start_date.errors.append('Overlaps lease #{} on this property'.format(clashes[0]))
+                    return render_template(
+                        'lease.jinja2',
+                        title = 'Add a lease',
+                        form = form,
+                        body = "lease body @properties.py",
+                    )
                 lease = Lease(
                     start_date = form.start_date.data,
                     end_date = form.end_date.data,
@@ -176,6 +259,8 @@ def add_lease(property_id):
                     property_id = property_id
                 )
                 db.session.add(lease)
+                db.session.flush()
+                lease.gen_lease_payments()   # same transaction as the lease
                 db.session.commit()
                 return redirect(url_for('property_bp.view_property', property_id = property_id))
             return render_template(
@@ -192,7 +277,14 @@ def add_lease(property_id):
     
 
 
+def post_user_charges():
+    """Bring balances up to date before the renters page is served, cached or not."""
+    if post_due_charges(user_id = current_user.id):
+        db.session.commit()
+
+
 @property_bp.route('/renters', methods=['GET', 'POST'])
+@cached_page(before=post_user_charges)
 def renters():
     """
     Display Renter Properties
@@ -200,40 +292,69 @@ def renters():
     POST: Validate form, create new renter property, redirect user to profile.
     """       
     if current_user.is_authenticated:
-
-        # TODO: Fix this query it sucks
-        renters = Renter.query.outerjoin(Lease, Renter.id == Lease.renter_id) \
-                                .outerjoin(Payment, Lease.id == Payment.lease_id) \
-                                .outerjoin(Property, Lease.property_id == Property.id) \
-                                .filter(Renter.user_id == current_user.id).all()
-
+        page = paged_renters()
         return render_template(
                 'renters.jinja2',
                 title = 'Your renters',
                 body = "Your renters",
                 name_order_first_last = True,   #TODO: implement toggle (js button or setting)
-                renters = renters,
+                renters = page.items,
+                page = page,
                 properties = properties
             )
     flash("U MUST BE LOGGED IN TO SEE THIS Pge")
     return redirect(url_for('auth_bp.login'))
 
 
+@property_bp.route('/renters/page', methods=['GET'])
+@read_replica
+def renters_page():
+    """JSON page of the renters listing, continue with ?cursor=<next_cursor>."""
+    if not current_user.is_authenticated:
+        abort(401)
+    page = paged_renters()
+    return jsonify(
+        items = [renter_json(renter) for renter in page.items],
+        next_cursor = page.next_cursor,
+        next_page = next_page_url('property_bp.renters_page', page)
+    )
+
+
 @property_bp.route('/renter/<renter_id>', methods=['GET', 'POST'])
+@cached_page()
 def renter(renter_id):
     if current_user.is_authenticated:
-        renter = Renter.query.outerjoin(Lease, Renter.id == Lease.renter_id) \
-                                .outerjoin(Payment, Lease.id == Payment.lease_id) \
-                                .outerjoin(Property, Lease.property_id == Property.id) \
-                                .filter(Renter.id == renter_id).first()
+        # Leases with their property and address in one extra query; payments are paged separately
+        renter = Renter.query.options(
+                    selectinload(Renter.leases).joinedload(Lease.property).joinedload(Property.address)
+                ).filter(Renter.id == renter_id, Renter.user_id == current_user.id).first()
+        if renter is None:
+            abort(404)
+        page = paged_payments(renter_id)
         return render_template(
             'view_renter.jinja2',
             # template = '',
-            renter = renter
+            renter = renter,
+            payments = page.items,
+            page = page
         )
     return redirect(url_for('auth_bp.login'))
 
 
+@property_bp.route('/renter/<renter_id>/payments', methods=['GET'])
+@read_replica
+def renter_payments_page(renter_id):
+    """JSON page of a renter's payment history, newest first by default."""
+    if not current_user.is_authenticated:
+        abort(401)
+    page = paged_payments(renter_id)
+    return jsonify(
+        items = [payment_json(payment) for payment in page.items],
+        next_cursor = page.next_cursor,
+        next_page = next_page_url('property_bp.renter_payments_page', page, renter_id = renter_id)
+    )
+
+
 @property_bp.route('/renter/<renter_id>/add_payment', methods=['GET', 'POST'])
 def add_payment(renter_id):
     if current_user.is_authenticated:
@@ -263,9 +384,270 @@ def add_payment(renter_id):
     return redirect(url_for('auth_bp.login'))   # Send to login page if not logged in
     
 
+@property_bp.route('/import/<kind>', methods=['POST'])
+def bulk_import(kind):
+    """
+    Bulk import properties, renters or leases from an uploaded CSV or NDJSON `file`.
+    The file is stored and imported by a background job; poll the returned status URL for its report,
+    which lists every rejected row with its errors.
+    """
+    if not current_user.is_authenticated:
+        abort(401)
+    max_import_size = current_app.config.get('MAX_IMPORT_SIZE', MAX_IMPORT_SIZE)
+    if request.content_length and request.content_length > max_import_size + FORM_OVERHEAD:
+        abort(413)  # refuse before the upload is parsed or spooled
+    upload = request.files.get('file')
+    if kind not in IMPORTERS or upload is None:
+        abort(400)
+    fmt = request.form.get('format') or format_for(upload.filename or '')
+    try:
+        digest, _ = blob_store.put(upload.stream, max_size=max_import_size)
+    except BlobTooLarge:
+        abort(413)
+    payload = {'kind': kind, 'digest': digest, 'fmt': fmt, 'user_id': current_user.id}
+    job = enqueue('import', payload, owner_id = current_user.id, max_attempts = 1)   # never insert twice
+    db.session.commit()
+    return job_accepted(job)
+
+
+@property_bp.route('/analytics/rebuild', methods=['POST'])
+def rebuild_analytics():
+    """Recompute the current user's analytics summaries in the background."""
+    if not current_user.is_authenticated:
+        abort(401)
+    job = enqueue('rebuild_analytics', {'user_id': current_user.id}, owner_id = current_user.id)
+    db.session.commit()
+    return job_accepted(job)
+
+
+@property_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status, attempts and result of a background job queued by the current user."""
+    if not current_user.is_authenticated:
+        abort(401)
+    job = Job.query.filter_by(id = job_id, user_id = current_user.id).first()
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
+@property_bp.route('/analytics', methods=['GET'])
+def portfolio_analytics():
+    """
+    Occupancy, vacancy, rent collected vs. due and delinquency per property and month.
+    Reads the precomputed property_months summaries, ?months= sets how far back to go (default 12).
+    """
+    if not current_user.is_authenticated:
+        flash("U MUST BE LOGGED IN TO SEE THIS Pge")
+        return redirect(url_for('auth_bp.login'))
+    months = min(max(request.args.get('months', 12, type=int), 1), 120)
+    first_month = analytics.month_start(datetime.datetime.utcnow())
+    for _ in range(months - 1):
+        first_month = analytics.month_start(first_month - datetime.timedelta(days=1))
+    rows, totals = analytics.portfolio(current_user.id, first_month)
+    addresses = dict(db.session.query(Property.id, Address.street)
+                               .join(Address, Property.address_id == Address.id)
+                               .filter(Property.user_id == current_user.id))
+    return render_template(
+        'portfolio_analytics.jinja2',
+        title = 'Portfolio analytics',
+        rows = rows,
+        totals = totals,
+        addresses = addresses
+    )
+
+
+@property_bp.route('/properties/vacant', methods=['GET'])
+@read_replica
+def vacant_properties():
+    """Your properties with no lease between ?start= and ?end= (YYYY-MM-DD, end optional for open-ended)."""
+    if not current_user.is_authenticated:
+        abort(401)
+    try:
+        start = datetime.datetime.strptime(request.args['start'], '%Y-%m-%d')
+        end = datetime.datetime.strptime(request.args['end'], '%Y-%m-%d') if request.args.get('end') else None
+    except (KeyError, ValueError):
+        abort(400)
+    return jsonify(property_ids = OccupancyIndex.load(user_id = current_user.id).vacant(start, end))
+
+
+@property_bp.route('/search', methods=['GET'])
+@read_replica
+def search_view():
+    """Autocomplete over your renters and properties: ?q=smi&kind=renter&limit=10"""
+    if not current_user.is_authenticated:
+        abort(401)
+    kind = request.args.get('kind')
+    if kind is not None and kind not in search.KINDS:
+        abort(400)
+    results = search.search(current_user.id, request.args.get('q', ''), kind,
+                            request.args.get('limit', search.DEFAULT_LIMIT, type=int))
+    for result in results:
+        if result['kind'] == 'renter':
+            result['url'] = url_for('property_bp.renter', renter_id = result['id'])
+        else:
+            result['url'] = url_for('property_bp.view_property', property_id = result['id'])
+    return jsonify(results = results)
+
+
+@property_bp.route('/export/payments.<fmt>', methods=['GET'])
+def export_payments(fmt):
+    """Download the full payment ledger as CSV or Parquet, streamed straight from a server-side cursor."""
+    if not current_user.is_authenticated:
+        abort(401)
+    return export_response(fmt, 'payments', exports.LEDGER_COLUMNS, exports.ledger_rows(current_user.id))
+
+
+@property_bp.route('/export/rent_roll.<fmt>', methods=['GET'])
+def export_rent_roll(fmt):
+    """Download the rent roll for ?month=YYYY-MM (default: this month) as CSV or Parquet."""
+    if not current_user.is_authenticated:
+        abort(401)
+    try:
+        month = datetime.datetime.strptime(request.args['month'], '%Y-%m') if 'month' in request.args \
+                else datetime.datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    except ValueError:
+        abort(400)
+    rows = exports.rent_roll_rows(current_user.id, month)
+    return export_response(fmt, 'rent_roll_{:%Y-%m}'.format(month), exports.RENT_ROLL_COLUMNS, rows)
+
+
 #Functions
-def convert_to_binary_data(filename):
-    # Convert digital data to binary format
-    with open(filename, 'rb') as file:
-        binary_data = file.read()
-    return binary_data
\ No newline at end of file
+def max_upload_size(config):
+    """Largest request body any upload form accepts, the default MAX_CONTENT_LENGTH."""
+    return max(config.get('MAX_IMAGE_SIZE', MAX_IMAGE_SIZE), config.get('MAX_IMPORT_SIZE', MAX_IMPORT_SIZE)) + FORM_OVERHEAD
+
+
+def job_accepted(job):
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = url_for('property_bp.job_status', job_id = job.id)
+    return response
+
+
+def export_response(fmt, name, columns, rows):
+    if fmt not in exports.FORMATS:
+        abort(404)
+    if fmt == 'parquet' and exports.pyarrow is None:
+        abort(501)  # pyarrow is not installed
+    mimetype, stream = exports.FORMATS[fmt]
+    return Response(
+        stream_with_context(stream(columns, rows)),
+        mimetype = mimetype,
+        headers = {'Content-Disposition': 'attachment; filename={}.{}'.format(name, fmt)}
+    )
+
+
+PROPERTY_SORTS = {
+    'created_on': Property.created_on,
+    'street': Address.street,
+    'city': Address.city,
+    'zip': Address.zip,
+}
+RENTER_SORTS = {
+    'created_on': Renter.created_on,
+    'first_name': Renter.first_name,
+    'last_name': Renter.last_name,
+    'email': Renter.email,
+}
+PAYMENT_SORTS = {
+    'created_on': Payment.created_on,
+    'amount': Payment.amount,
+}
+
+
+def paged_properties():
+    # One row per property with its current lease and renter already attached (row.Lease / row.Renter)
+    current = Lease.current_subquery('property_id')
+    query = db.session.query(Property, Address, Lease, Renter) \
+                      .join(Address, Property.address_id == Address.id) \
+                      .outerjoin(current, current.c.property_id == Property.id) \
+                      .outerjoin(Lease, Lease.id == current.c.lease_id) \
+                      .outerjoin(Renter, Lease.renter_id == Renter.id) \
+                      .filter(Property.user_id == current_user.id)
+    key = lambda row, sort: (getattr(row.Property if sort == 'created_on' else row.Address, sort), row.Property.id)
+    return paged(query, PROPERTY_SORTS, Property.id, key, 'created_on')
+
+
+def paged_renters():
+    # Status comes from the eager-loaded leases, one extra query per page instead of one per renter
+    query = Renter.query.options(selectinload(Renter.leases)).filter(Renter.user_id == current_user.id)
+    key = lambda renter, sort: (getattr(renter, sort), renter.id)
+    return paged(query, RENTER_SORTS, Renter.id, key, 'last_name')
+
+
+def paged_payments(renter_id):
+    query = Payment.query.filter(Payment.renter_id == renter_id, Payment.user_id == current_user.id)
+    key = lambda payment, sort: (getattr(payment, sort), payment.id)
+    return paged(query, PAYMENT_SORTS, Payment.id, key, 'created_on', 'desc')
+
+
+def paged(query, sorts, id_column, key, default_sort, default_order='asc'):
+    try:
+        return paginate(query, sorts, id_column, key, default_sort, default_order)
+    except InvalidCursor:
+        abort(400)
+
+
+def next_page_url(endpoint, page, **values):
+    if page.next_cursor is None:
+        return None
+    return url_for(endpoint, cursor = page.next_cursor, sort = page.sort,
+                   order = 'desc' if page.descending else 'asc', **values)
+
+
+def property_row_json(row):
+    lease, renter = row.Lease, row.Renter
+    return {
+        'id': row.Property.id,
+        'street': row.Address.street,
+        'city': row.Address.city,
+        'state': row.Address.state,
+        'zip': row.Address.zip,
+        'rented': lease is not None,
+        'renter': {'id': renter.id, 'name': '{} {}'.format(renter.first_name, renter.last_name)} if renter else None,
+        'lease_start': lease.start_date.isoformat() if lease else None,
+        'lease_end': lease.end_date.isoformat() if lease and lease.end_date else None,
+    }
+
+
+def renter_json(renter):
+    return {
+        'id': renter.id,
+        'first_name': renter.first_name,
+        'last_name': renter.last_name,
+        'email': renter.email,
+        'phone': renter.phone,
+        'active': renter.current_lease() is not None,
+        'balance': renter.current_balance,
+        'delinquent': renter.is_delinquent,
+    }
+
+
+def payment_json(payment):
+    return {
+        'id': payment.id,
+        'amount': payment.amount,
+        'date': payment.date.isoformat() if payment.date else None,
+        'description': payment.description,
+    }
+
+
+def move_image_to_store(property_):
+    # Move a legacy inline image into the blob store, returns False if there is none
+    if not property_.image:
+        return False
+    property_.image_digest, property_.image_size = blob_store.put(io.BytesIO(property_.image))
+    property_.image = None
+    db.session.commit()
+    return True
+
+
+@click.command('move-images')
+def move_images_command():
+    """Move every legacy inline property image into the blob store, one committed property at a time."""
+    ids = [id_ for id_, in db.session.query(Property.id).filter(Property.image != None).order_by(Property.id)]
+    for id_ in ids:
+        move_image_to_store(Property.query.get(id_))
+        db.session.expunge_all()    # drop the image bytes before loading the next one
+    click.echo('Moved {} images.'.format(len(ids)))
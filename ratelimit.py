@@ -0,0 +1,89 @@
+"""Token-bucket rate limiting, checked before any database or password-hash work."""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class MemoryBuckets(object):
+    """Buckets for one worker process, the least recently used are dropped past `maxsize`."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+            while len(self.buckets) > self.maxsize:
+                self.buckets.popitem(last=False)
+            return allowed
+
+
+class RedisBuckets(object):
+    """Buckets shared by every worker, refilled and spent atomically inside Redis."""
+
+    SCRIPT = """
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HMSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return allowed
+    """
+
+    def __init__(self, url):
+        import redis    # optional dependency, only needed when CACHE_REDIS_URL is set
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return bool(self.script(keys=['hom:ratelimit:' + key], args=[capacity, rate, time.time()]))
+
+
+class LoginLimiter(object):
+    """
+    Per-IP and per-account token buckets for /login.
+    LOGIN_IP_BURST / LOGIN_IP_PER_MINUTE and LOGIN_ACCOUNT_BURST / LOGIN_ACCOUNT_PER_MINUTE size them;
+    `stats` counts allowed and rejected attempts for the metrics endpoint. Behind a reverse proxy set
+    PROXY_FIX_HOPS, or every client shares the proxy's address and bucket.
+    """
+
+    def __init__(self, app=None):
+        self.buckets = MemoryBuckets()
+        self.limits = {'ip': (20, 20), 'account': (5, 5)}
+        self.stats = Counter()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config.get('CACHE_REDIS_URL'):
+            self.buckets = RedisBuckets(app.config['CACHE_REDIS_URL'])
+        self.limits = {
+            'ip': (app.config.get('LOGIN_IP_BURST', 20), app.config.get('LOGIN_IP_PER_MINUTE', 20)),
+            'account': (app.config.get('LOGIN_ACCOUNT_BURST', 5), app.config.get('LOGIN_ACCOUNT_PER_MINUTE', 5)),
+        }
+
+    def allow(self, scope, key):
+        burst, per_minute = self.limits[scope]
+        if self.buckets.take('{}:{}'.format(scope, key), burst, per_minute / 60.0):
+            return True
+        self.stats['rejected_' + scope] += 1
+        return False
+
+    def allow_ip(self, ip):
+        return self.allow('ip', ip or 'unknown')
+
+    def allow_account(self, email):
+        return self.allow('account', (email or '').strip().lower())
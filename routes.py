@@ -3,6 +3,8 @@ from flask import Blueprint, render_template, redirect, url_for, session
 from flask_login import current_user, logout_user
 from flask import current_app as app
 from flask_login import login_required
+from .fragments import cached_page
+from .sessions import regenerate
 
 
 # Blueprint Configuration
@@ -13,11 +15,17 @@ main_bp = Blueprint(
     static_folder='static'
 )
 
+def seed_session():
+    """Runs on cached hits too, so /session always has its value."""
+    if 'redis_test' not in session:     # assigning on every hit would rewrite the stored session
+        session['redis_test'] = 'This is a session variable.'
+
+
 @main_bp.route('/', methods=['GET', 'POST'])
 @login_required
+@cached_page(before=seed_session)
 def dashboard():
     """Logged in Dashboard screen."""
-    session['redis_test'] = 'This is a session variable.'
     return render_template(
         'dashboard.jinja2',
         title='Flask-Session Tutorial.',
@@ -35,7 +43,7 @@ def session_view():
         'session.jinja2',
         title='Flask-Session Tutorial.',
         template='dashboard-template',
-        session_variable=str(session['redis_test'])
+        session_variable=str(session.get('redis_test'))
     )
 
 @main_bp.route("/logout")
@@ -43,4 +51,5 @@ def session_view():
 def logout():
     """User log-out logic."""
     logout_user()
+    regenerate()
     return redirect(url_for('auth_bp.login'))
\ No newline at end of file
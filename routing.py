@@ -0,0 +1,49 @@
+"""Read-replica routing for read-only views, through Flask-SQLAlchemy's `replica` bind."""
+import functools
+from flask import g, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+
+
+REPLICA_BIND = 'replica'    # SQLALCHEMY_BINDS = {'replica': 'postgresql://...'}
+
+
+class RoutingSession(SignallingSession):
+    """
+    Sends reads to the replica inside views marked with `read_replica`, as long as this session has
+    written nothing. The first flush pins the rest of the request to the primary, so a view always
+    reads its own writes.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super(RoutingSession, self).__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kw):
+        # SQLAlchemy 1.4 passes bind= and private flags that SignallingSession.get_bind does not accept
+        if bind is not None:
+            return bind
+        if has_request_context() and g.get('read_replica'):
+            if self._flushing or self.new or self.dirty or self.deleted:
+                g.read_replica = False
+            elif REPLICA_BIND in (self.app.config.get('SQLALCHEMY_BINDS') or {}):
+                return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def read_replica(view):
+    """Let a read-only view's queries go to the replica when one is configured."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.read_replica = False
+    return wrapper
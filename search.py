@@ -0,0 +1,209 @@
+"""
+Search index over renters (name, email, phone) and properties (street, city, state, zip).
+
+One document per row lives in `search_documents`, shaped for the database in use:
+- SQLite: an FTS5 virtual table with a prefix index, so autocomplete is an index lookup.
+- PostgreSQL: a plain table with a pg_trgm GIN index, for substring and fuzzy (word similarity) matches.
+- Anything else: the same plain table, searched with LIKE.
+Documents are rewritten in the committing transaction whenever the ORM writes a renter, property or address.
+"""
+import re
+import click
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import table, column
+from . import db
+from .models.address import Address
+from .models.property import Property
+from .models.renter import Renter
+
+
+CHUNK_SIZE = 500        # ids per IN (...) list
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+KINDS = ('renter', 'property')
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents USING fts5("
+    "kind UNINDEXED, ref_id UNINDEXED, user_id UNINDEXED, label UNINDEXED, body, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+]
+TABLE_DDL = (
+    "CREATE TABLE IF NOT EXISTS search_documents ("
+    "doc_id BIGINT NOT NULL PRIMARY KEY, kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, "
+    "user_id INTEGER, label VARCHAR(400) NOT NULL, body TEXT NOT NULL)"
+)
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    TABLE_DDL,
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_body_trgm ON search_documents USING gin (body gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_user_id ON search_documents (user_id)",
+]
+GENERIC_DDL = [TABLE_DDL]
+
+
+def create_index(connection):
+    ddl = {'sqlite': SQLITE_DDL, 'postgresql': POSTGRES_DDL}.get(connection.dialect.name, GENERIC_DDL)
+    for statement in ddl:
+        connection.execute(text(statement))
+
+
+@event.listens_for(db.Model.metadata, 'after_create')
+def create_index_with_tables(target, connection, **kw):
+    """`db.create_all()` builds the index too; migrated databases get it from revision 0009."""
+    if connection.engine is not db.engine:  # binds such as the read replica get their schema from the primary
+        return
+    create_index(connection)
+
+
+def documents(dialect):
+    # FTS5 rows are addressed by rowid, which makes replacing one document a primary-key delete
+    key = 'rowid' if dialect == 'sqlite' else 'doc_id'
+    return table('search_documents', column(key), column('kind'), column('ref_id'),
+                 column('user_id'), column('label'), column('body'))
+
+
+def doc_key(kind, ref_id):
+    return ref_id * len(KINDS) + KINDS.index(kind)
+
+
+# Keeping documents in sync
+def mark_stale(session, kind, ids):
+    """Queue documents for rewriting; Core inserts call this themselves, the ORM events cover the rest."""
+    session.info.setdefault('search_stale', set()).update((kind, id_) for id_ in ids if id_ is not None)
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_stale_documents(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Renter):
+            mark_stale(session, 'renter', [obj.id])
+        elif isinstance(obj, Property):
+            mark_stale(session, 'property', [obj.id])
+        elif isinstance(obj, Address):
+            mark_stale(session, 'address', [obj.id])
+
+
+@event.listens_for(Session, 'before_commit')
+def write_stale_documents(session):
+    session.flush()     # commit flushes only after this hook
+    stale = session.info.pop('search_stale', None)
+    if stale:
+        reindex(session, stale)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_stale_documents(session):
+    session.info.pop('search_stale', None)
+
+
+def reindex(session, stale):
+    """Rewrite the documents for a set of ('renter' | 'property' | 'address', id); rows that are gone are dropped."""
+    renter_ids = sorted(id_ for kind, id_ in stale if kind == 'renter')
+    property_ids = {id_ for kind, id_ in stale if kind == 'property'}
+    address_ids = sorted(id_ for kind, id_ in stale if kind == 'address')
+    for chunk in chunks(address_ids):
+        property_ids.update(id_ for id_, in session.query(Property.id).filter(Property.address_id.in_(chunk)))
+
+    docs = documents(db.engine.dialect.name)
+    key = list(docs.c)[0]
+    for kind, ids, load in (('renter', renter_ids, renter_documents),
+                            ('property', sorted(property_ids), property_documents)):
+        for chunk in chunks(ids):
+            session.execute(docs.delete().where(key.in_([doc_key(kind, id_) for id_ in chunk])))
+            rows = load(session, chunk)
+            if rows:
+                session.execute(docs.insert(), [dict(row, **{key.name: doc_key(row['kind'], row['ref_id'])})
+                                                 for row in rows])
+
+
+def renter_documents(session, ids):
+    query = session.query(Renter.id, Renter.user_id, Renter.first_name, Renter.last_name, Renter.email, Renter.phone) \
+                   .filter(Renter.id.in_(ids))
+    return [
+        dict(kind='renter', ref_id=id_, user_id=user_id,
+             label='{} {}'.format(first_name, last_name),
+             body=' '.join([first_name, last_name, email, phone, re.sub(r'\D', '', phone)]))
+        for id_, user_id, first_name, last_name, email, phone in query
+    ]
+
+
+def property_documents(session, ids):
+    query = session.query(Property.id, Property.user_id, Address.street, Address.city, Address.state, Address.zip) \
+                   .join(Address, Property.address_id == Address.id) \
+                   .filter(Property.id.in_(ids))
+    return [
+        dict(kind='property', ref_id=id_, user_id=user_id,
+             label='{}, {}, {} {}'.format(street, city, state, zip_),
+             body=' '.join([street, city, state, str(zip_)]))
+        for id_, user_id, street, city, state, zip_ in query
+    ]
+
+
+def rebuild(user_id=None):
+    """Rewrite every document, or one user's. The caller commits."""
+    stale = set()
+    for kind, model in (('renter', Renter), ('property', Property)):
+        query = db.session.query(model.id)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        stale.update((kind, id_) for id_, in query)
+    reindex(db.session, stale)
+    return len(stale)
+
+
+@click.command('rebuild-search')
+@click.option('--user', 'user_id', type=int, default=None, help='Only rebuild this user id.')
+def rebuild_command(user_id):
+    """Rebuild the search index, e.g. after upgrading or a bulk load outside the app."""
+    count = rebuild(user_id)
+    db.session.commit()
+    click.echo('Indexed {} documents.'.format(count))
+
+
+# Querying
+def search(user_id, q, kind=None, limit=DEFAULT_LIMIT):
+    """
+    Best matches for `q` among one user's documents, as dicts of kind, id and label.
+    Every term must match as a word prefix (substring outside SQLite), so results follow typing.
+    """
+    terms = re.findall(r'\w+', (q or '').lower())
+    if not terms:
+        return []
+    limit = min(max(limit, 1), MAX_LIMIT)
+    params = {'user_id': user_id, 'limit': limit}
+    kind_filter = ''
+    if kind:
+        params['kind'] = kind
+        kind_filter = 'AND kind = :kind'
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        params['match'] = ' '.join('"{}"*'.format(term) for term in terms)
+        sql = ("SELECT kind, ref_id, label FROM search_documents "
+               "WHERE search_documents MATCH :match AND user_id = :user_id {} "
+               "ORDER BY rank LIMIT :limit").format(kind_filter)
+    else:
+        # ILIKE lets Postgres use the trigram index, LOWER() keeps other databases case-insensitive
+        like = 'body ILIKE :term{}' if dialect == 'postgresql' else 'LOWER(body) LIKE :term{}'
+        likes = []
+        for i, term in enumerate(terms):
+            params['term{}'.format(i)] = '%{}%'.format(term)
+            likes.append(like.format(i))
+        where = ' AND '.join(likes)
+        order = 'label'
+        if dialect == 'postgresql':
+            params['q'] = ' '.join(terms)
+            where = '({}) OR :q <% body'.format(where)     # trigram word similarity catches typos
+            order = 'word_similarity(:q, body) DESC, label'
+        sql = ("SELECT kind, ref_id, label FROM search_documents "
+               "WHERE user_id = :user_id {} AND ({}) ORDER BY {} LIMIT :limit").format(kind_filter, where, order)
+
+    return [{'kind': kind_, 'id': ref_id, 'label': label}
+            for kind_, ref_id, label in db.session.execute(text(sql), params)]
+
+
+def chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
@@ -0,0 +1,255 @@
+"""Server-side sessions: the cookie only carries a random id, the data lives in memory, on disk or in Redis."""
+import hashlib
+import os
+import re
+import secrets
+import threading
+import time
+from flask import session as current_session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+SID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{43}$')  # secrets.token_urlsafe(32)
+SWEEP_INTERVAL = 600    # seconds between expired-session sweeps, per process
+
+# Flask's tagged JSON, as in its cookie sessions: round-trips dates, bytes and tuples, and unlike
+# pickle, loading it can never run code planted in a shared store
+serializer = TaggedJSONSerializer()
+
+
+def dumps(data):
+    return serializer.dumps(dict(data)).encode('utf-8')
+
+
+def loads(raw):
+    return serializer.loads(raw.decode('utf-8'))
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers the digest of what was loaded, so unchanged data is never written back."""
+
+    def __init__(self, initial=None, sid=None, new=False, digest=None):
+        def on_update(self):
+            self.modified = True
+        super(ServerSession, self).__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.digest = digest
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh id and retire the old one, so an id known beforehand is worthless."""
+        if not self.new:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.digest = None
+        self.modified = True
+
+
+def regenerate():
+    """Rotate the current session id; call on login and logout to rule out session fixation."""
+    rotate = getattr(current_session, 'regenerate', None)
+    if rotate is not None:      # cookie sessions carry no id to fix
+        rotate()
+
+
+class MemoryStore(object):
+    """One dict per worker process, fine for development and single-process deployments."""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.next_sweep = time.time() + SWEEP_INTERVAL
+
+    def get(self, sid):
+        with self.lock:
+            entry = self.entries.get(sid)
+            if entry is None:
+                return None
+            raw, expires = entry
+            if expires < time.time():
+                del self.entries[sid]
+                return None
+            return raw
+
+    def set(self, sid, raw, ttl):
+        now = time.time()
+        with self.lock:
+            self.entries[sid] = (raw, now + ttl)
+            if now >= self.next_sweep:
+                self.next_sweep = now + SWEEP_INTERVAL
+                for key in [key for key, (_, expires) in self.entries.items() if expires < now]:
+                    del self.entries[key]
+
+    def touch(self, sid, ttl):
+        with self.lock:
+            if sid in self.entries:
+                self.entries[sid] = (self.entries[sid][0], time.time() + ttl)
+
+    def delete(self, sid):
+        with self.lock:
+            self.entries.pop(sid, None)
+
+
+class FileSystemStore(object):
+    """One file per session; the modification time is the last access and expires it after the TTL."""
+
+    def __init__(self, root, ttl):
+        self.root = root
+        self.ttl = ttl
+        self.next_sweep = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, sid):
+        return os.path.join(self.root, sid)
+
+    def get(self, sid):
+        path = self.path(sid)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, sid, raw, ttl):
+        tmp = '{}.{}.tmp'.format(self.path(sid), os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp, self.path(sid))
+        if time.time() >= self.next_sweep:
+            self.sweep()
+
+    def sweep(self):
+        """
+        Remove sessions idle for longer than the TTL, which `get` never sees again once a visitor leaves.
+        Runs at most every SWEEP_INTERVAL from `set`; returns how many files went.
+        """
+        now = time.time()
+        self.next_sweep = now + SWEEP_INTERVAL
+        removed = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime + self.ttl < now:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:   # another worker got there first
+                    pass
+        return removed
+
+    def touch(self, sid, ttl):
+        try:
+            os.utime(self.path(sid))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, sid):
+        try:
+            os.remove(self.path(sid))
+        except FileNotFoundError:
+            pass
+
+
+class RedisStore(object):
+    """Shared by every worker; anything speaking the Redis protocol works."""
+
+    def __init__(self, url, prefix='hom:session:'):
+        import redis    # optional dependency, only needed for the redis backend
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        return self.client.get(self.prefix + sid)
+
+    def set(self, sid, raw, ttl):
+        self.client.set(self.prefix + sid, raw, ex=ttl)
+
+    def touch(self, sid, ttl):
+        self.client.expire(self.prefix + sid, ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    SESSION_BACKEND picks 'memory', 'filesystem' or 'redis'. It defaults to redis when
+    SESSION_REDIS_URL or CACHE_REDIS_URL is set, otherwise to files under SESSION_FILE_DIR
+    (instance/sessions). Sessions expire after PERMANENT_SESSION_LIFETIME without a request.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    @classmethod
+    def from_app(cls, app):
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        redis_url = app.config.get('SESSION_REDIS_URL') or app.config.get('CACHE_REDIS_URL')
+        backend = app.config.get('SESSION_BACKEND') or ('redis' if redis_url else 'filesystem')
+        if backend == 'redis':
+            store = RedisStore(redis_url)
+        elif backend == 'filesystem':
+            store = FileSystemStore(
+                app.config.get('SESSION_FILE_DIR') or os.path.join(app.instance_path, 'sessions'), ttl
+            )
+        elif backend == 'memory':
+            store = MemoryStore()
+        else:
+            raise ValueError('Unknown SESSION_BACKEND {!r}'.format(backend))
+        return cls(store)
+
+    def ttl(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and SID_PATTERN.match(sid):
+            raw = self.store.get(sid)
+            if raw is not None:
+                try:
+                    return ServerSession(loads(raw), sid=sid, digest=hashlib.sha1(raw).digest())
+                except Exception:
+                    self.store.delete(sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.previous_sid is not None:
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            if not session.new or session.previous_sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        ttl = self.ttl(app)
+        raw = dumps(session)
+        if hashlib.sha1(raw).digest() != session.digest:
+            self.store.set(session.sid, raw, ttl)
+        else:
+            self.store.touch(session.sid, ttl)  # unchanged, only push the expiry out
+
+        # The cookie only holds the id, it needs re-sending when new or when a permanent expiry slides
+        if session.new or (session.permanent and app.config.get('SESSION_REFRESH_EACH_REQUEST', True)):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
@@ -0,0 +1,203 @@
+"""
+Point-in-time portfolio state: occupancy, rates, renters and balances as of any date.
+
+Balances come from the nearest monthly snapshot before the date plus the charges and payments
+dated between the two, so a question about 2025-12-31 reads at most a month of history.
+Occupancy comes from the lease intervals. Writes dated before existing snapshots drop those
+snapshots in the same transaction; `flask snapshot-portfolios` (or the job) takes missing ones again.
+"""
+import datetime
+import click
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from . import db
+from .analytics import values
+from .occupancy import OccupancyIndex
+from .models.address import Address
+from .models.charge import Charge
+from .models.lease import Lease, as_datetime, add_months
+from .models.payment import Payment
+from .models.property import Property
+from .models.renter import Renter
+from .models.snapshot import PortfolioSnapshot
+from .models.summary import month_start
+from .models.user import User
+
+
+# Invalidation
+def mark_backdated(session, user_id, date):
+    """Snapshots of `user_id` taken after `date` no longer hold; they are dropped at commit."""
+    if user_id is None or date is None:
+        return
+    date = as_datetime(date)
+    backdated = session.info.setdefault('backdated', {})
+    backdated[user_id] = min(date, backdated.get(user_id, date))
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_backdated_writes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Charge, Payment)):
+            dates = values(obj, 'date' if isinstance(obj, Payment) else 'due_date')
+            for user_id in values(obj, 'user_id'):
+                for date in dates:
+                    mark_backdated(session, user_id, date)
+        elif isinstance(obj, Lease):
+            # Its charges are written through Core, from the lease start on
+            starts = values(obj, 'start_date')
+            queued = session.info.setdefault('backdated_properties', {})
+            for property_id in values(obj, 'property_id'):
+                property_id = int(property_id)      # views may assign the raw URL segment
+                for start in starts:
+                    start = as_datetime(start)
+                    queued[property_id] = min(start, queued.get(property_id, start))
+
+
+@event.listens_for(Session, 'before_commit')
+def drop_backdated_snapshots(session):
+    session.flush()     # commit flushes only after this hook
+    queued = session.info.pop('backdated_properties', None)
+    if queued:
+        owners = session.query(Property.id, Property.user_id).filter(Property.id.in_(list(queued)))
+        for property_id, user_id in owners:
+            mark_backdated(session, user_id, queued[property_id])
+    for user_id, date in session.info.pop('backdated', {}).items():
+        session.query(PortfolioSnapshot).filter(
+            PortfolioSnapshot.user_id == user_id, PortfolioSnapshot.as_of > date
+        ).delete(synchronize_session=False)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_backdated_writes(session):
+    session.info.pop('backdated', None)
+    session.info.pop('backdated_properties', None)
+
+
+# Balances
+def balances(user_id, until):
+    """
+    ({lease_id: balance}, {renter_id: payments outside any lease}) counting charges due and payments
+    dated before `until`, replayed forward from the latest snapshot at or before it.
+    """
+    snapshot = PortfolioSnapshot.query.filter(PortfolioSnapshot.user_id == user_id, PortfolioSnapshot.as_of <= until) \
+                                      .order_by(PortfolioSnapshot.as_of.desc()).first()
+    leases, renters = snapshot.unpack() if snapshot else ({}, {})
+
+    charges = db.session.query(Charge.lease_id, func.sum(Charge.amount)) \
+                        .filter(Charge.user_id == user_id, Charge.due_date < until)
+    payments = db.session.query(Payment.lease_id, Payment.renter_id, func.sum(Payment.amount)) \
+                         .filter(Payment.user_id == user_id, Payment.date < until)
+    if snapshot is not None:
+        charges = charges.filter(Charge.due_date >= snapshot.as_of)
+        payments = payments.filter(Payment.date >= snapshot.as_of)
+
+    for lease_id, amount in charges.group_by(Charge.lease_id):
+        leases[lease_id] = leases.get(lease_id, 0) + (amount or 0)
+    for lease_id, renter_id, amount in payments.group_by(Payment.lease_id, Payment.renter_id):
+        if lease_id is not None:
+            leases[lease_id] = leases.get(lease_id, 0) - (amount or 0)
+        else:
+            renters[renter_id] = renters.get(renter_id, 0) - (amount or 0)
+    return ({k: round(v, 2) for k, v in leases.items()},
+            {k: round(v, 2) for k, v in renters.items()})
+
+
+def take(user_id, as_of):
+    """Store the snapshot at `as_of`, built from the previous one. The caller commits."""
+    leases, renters = balances(user_id, as_of)
+    PortfolioSnapshot.query.filter_by(user_id=user_id, as_of=as_of).delete(synchronize_session=False)
+    db.session.add(PortfolioSnapshot(user_id=user_id, as_of=as_of, data=PortfolioSnapshot.pack(leases, renters)))
+
+
+def take_missing(user_id=None, now=None):
+    """
+    Snapshot every month start between a user's first charge or payment and now that has none yet,
+    oldest first so each builds on the one before. Commits per user; returns how many were taken.
+    """
+    now = now or datetime.datetime.utcnow()
+    user_ids = [user_id] if user_id is not None else [id_ for id_, in db.session.query(User.id)]
+    taken = 0
+    for user_id in user_ids:
+        first = min(filter(None, [
+            db.session.query(func.min(Charge.due_date)).filter(Charge.user_id == user_id).scalar(),
+            db.session.query(func.min(Payment.date)).filter(Payment.user_id == user_id).scalar(),
+        ]), default=None)
+        if first is None:
+            continue
+        existing = {as_of for as_of, in db.session.query(PortfolioSnapshot.as_of).filter_by(user_id=user_id)}
+        month = add_months(month_start(as_datetime(first)), 1)
+        while month <= now:
+            if month not in existing:
+                take(user_id, month)
+                db.session.flush()
+                taken += 1
+            month = add_months(month, 1)
+        db.session.commit()
+    return taken
+
+
+@click.command('snapshot-portfolios')
+@click.option('--user-id', type=int, default=None, help='Only snapshot this account.')
+def snapshot_command(user_id):
+    """Take the monthly portfolio snapshots that are missing, run it from cron after each month starts."""
+    click.echo('Took {} snapshots.'.format(take_missing(user_id)))
+
+
+# Point-in-time portfolio
+def portfolio_as_of(user_id, date):
+    """Every property with its lease, rate, renter and balances on `date`, plus portfolio totals."""
+    day = as_datetime(date)
+    lease_balances, unassigned = balances(user_id, day + datetime.timedelta(days=1))
+    occupancy = OccupancyIndex.load(user_id=user_id)
+
+    renter_balances = dict(unassigned)
+    for lease_id, renter_id in occupancy.leases():
+        renter_balances[renter_id] = renter_balances.get(renter_id, 0) + lease_balances.get(lease_id, 0)
+
+    occupants = {property_id: occupancy.occupant(property_id, day) for property_id in occupancy.properties}
+    lease_ids = [occupant[0] for occupant in occupants.values() if occupant]
+    leases = {lease.id: lease for lease in Lease.query.filter(Lease.id.in_(lease_ids))} if lease_ids else {}
+    renter_ids = [occupant[1] for occupant in occupants.values() if occupant]
+    renters = {renter.id: renter for renter in Renter.query.filter(Renter.id.in_(renter_ids))} if renter_ids else {}
+    addresses = dict(db.session.query(Property.id, Address).join(Address, Property.address_id == Address.id)
+                               .filter(Property.user_id == user_id))
+
+    units = []
+    for property_id, occupant in sorted(occupants.items()):
+        address = addresses.get(property_id)
+        unit = {
+            'property_id': property_id,
+            'address': '{}, {}, {} {}'.format(address.street, address.city, address.state, address.zip)
+                       if address else None,
+            'occupied': occupant is not None,
+            'lease': None,
+            'renter': None,
+        }
+        if occupant:
+            lease, renter = leases[occupant[0]], renters.get(occupant[1])
+            unit['lease'] = {
+                'id': lease.id,
+                'rate': lease.rate,
+                'start_date': lease.start_date.isoformat(),
+                'end_date': lease.end_date.isoformat() if lease.end_date else None,
+                'balance': round(lease_balances.get(lease.id, 0), 2),
+            }
+            if renter is not None:
+                unit['renter'] = {
+                    'id': renter.id,
+                    'name': '{} {}'.format(renter.first_name, renter.last_name),
+                    'balance': round(renter_balances.get(renter.id, 0), 2),
+                }
+        units.append(unit)
+
+    occupied = [unit for unit in units if unit['occupied']]
+    return {
+        'as_of': day.date().isoformat(),
+        'units': units,
+        'totals': {
+            'units': len(units),
+            'occupied': len(occupied),
+            'rent_roll': round(sum(unit['lease']['rate'] or 0 for unit in occupied), 2),
+            'outstanding': round(sum(balance for balance in renter_balances.values() if balance > 0), 2),
+        },
+    }
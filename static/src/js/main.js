@@ -12,3 +12,79 @@ if (alertButton){
 
   }, false);
 }
+
+
+// Lazy paging for listing tables: "Load more" buttons fetch the next JSON page and append rows
+function tableCell(text, href) {
+  let td = document.createElement('td');
+  let target = td;
+  if (href) {
+    target = document.createElement('a');
+    target.href = href;
+    td.appendChild(target);
+  }
+  target.textContent = text === null || text === undefined ? ' -- ' : text;
+  return td;
+}
+
+function monthYear(iso) {
+  if (!iso) { return null; }
+  let date = new Date(iso);
+  return (date.getMonth() + 1) + '/' + date.getFullYear();
+}
+
+const rowBuilders = {
+  property: function (item) {
+    let status = tableCell(item.rented ? ' Rented ' : ' Vacant ');
+    status.style.color = item.rented ? 'green' : 'red';
+    return [
+      tableCell(item.street, '/property/' + item.id),
+      tableCell(item.city),
+      tableCell(item.state),
+      tableCell(item.zip),
+      status,
+      item.renter ? tableCell(item.renter.name, '/renter/' + item.renter.id) : tableCell(null),
+      tableCell(monthYear(item.lease_start)),
+      tableCell(monthYear(item.lease_end))
+    ];
+  },
+  renter: function (item, body) {
+    let name = body.dataset.nameOrder === 'last_first'
+      ? item.last_name + ', ' + item.first_name
+      : item.first_name + ' ' + item.last_name;
+    let status = tableCell(item.active ? 'Active' : 'Inactive');
+    status.style.color = item.active ? 'green' : 'red';
+    let balance = tableCell(item.balance.toFixed(2));
+    if (item.delinquent) { balance.style.color = 'red'; }
+    return [tableCell(name, '/renter/' + item.id), tableCell(item.email), tableCell(item.phone), status, balance];
+  },
+  payment: function (item) {
+    return [tableCell(item.amount), tableCell(item.date), tableCell(item.description)];
+  }
+};
+
+document.querySelectorAll('button.load-more').forEach(function (button) {
+  button.addEventListener('click', function (event) {
+    event.preventDefault();
+    let body = document.querySelector(button.dataset.target);
+    let buildRow = rowBuilders[button.dataset.row];
+    button.disabled = true;
+
+    fetch(button.dataset.nextPage, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+      .then(function (response) { return response.json(); })
+      .then(function (page) {
+        page.items.forEach(function (item) {
+          let tr = document.createElement('tr');
+          buildRow(item, body).forEach(function (td) { tr.appendChild(td); });
+          body.appendChild(tr);
+        });
+        if (page.next_page) {
+          button.dataset.nextPage = page.next_page;
+          button.disabled = false;
+        } else {
+          button.remove();
+        }
+      })
+      .catch(function () { button.disabled = false; });
+  }, false);
+});
@@ -0,0 +1,35 @@
+import os
+import pytest
+from hom import create_app, db
+from hom.models.user import User
+
+
+class TestConfig(object):
+    SECRET_KEY = 'test'
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SESSION_BACKEND = 'memory'
+
+
+@pytest.fixture
+def app(tmp_path):
+    TestConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(str(tmp_path), 'test.sqlite')
+    TestConfig.BLOB_STORE_PATH = os.path.join(str(tmp_path), 'blobs')
+    app = create_app(TestConfig)
+    with app.app_context():
+        user = User(username='landlord', first_name='Lana', last_name='Lord', email='lana@example.com')
+        user.set_password('secret1')
+        db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/login', data={'email': 'lana@example.com', 'password': 'secret1'})
+    return client
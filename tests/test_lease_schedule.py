@@ -0,0 +1,36 @@
+"""Rent schedules generated by Lease.schedule."""
+import datetime
+from hom.models.lease import Lease
+from hom.models.property import Property  # noqa: F401, relationship targets must be mapped
+from hom.models.renter import Renter  # noqa: F401
+
+
+def lease(start, end=None, terms=12, rate=1000):
+    return Lease(start_date=start, end_date=end, terms=terms, rate=rate)
+
+
+def total(rows):
+    return round(sum(amount for _, amount, _ in rows), 2)
+
+
+def test_mid_month_lease_charges_twelve_months_of_rent():
+    rows = lease(datetime.datetime(2025, 1, 15), datetime.datetime(2026, 1, 14)).schedule()
+    assert total(rows) == 12 * 1000
+    assert rows[0][:2] == (datetime.datetime(2025, 1, 15), 548.39)
+    assert rows[-1][:2] == (datetime.datetime(2026, 1, 1), 451.61)
+
+
+def test_open_ended_mid_month_lease_runs_terms_months():
+    rows = lease(datetime.datetime(2025, 1, 15)).schedule()
+    assert total(rows) == 12 * 1000
+    assert rows[-1][0] == datetime.datetime(2026, 1, 1)
+
+
+def test_lease_ending_in_its_first_month_is_prorated_to_the_end_date():
+    rows = lease(datetime.datetime(2025, 1, 15), datetime.datetime(2025, 1, 20)).schedule()
+    assert [amount for _, amount, _ in rows] == [193.55]
+
+
+def test_lease_starting_on_the_first_has_no_prorated_charges():
+    rows = lease(datetime.datetime(2025, 3, 1), terms=3).schedule()
+    assert [(due.month, amount) for due, amount, _ in rows] == [(3, 1000), (4, 1000), (5, 1000)]
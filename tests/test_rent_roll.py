@@ -0,0 +1,18 @@
+"""Rent roll export for payments recorded through the app."""
+import csv
+import io
+
+
+def test_payments_made_in_the_app_show_as_paid(client):
+    client.post('/add_property', data={'street': '1 Main St', 'city': 'Town', 'state': 'New York', 'zip': '12345'})
+    client.post('/add_renter', data={'first_name': 'Jo', 'last_name': 'Smith', 'email': 'jo@example.com',
+                                     'phone': '555-123-4567'})
+    client.post('/property/1/lease', data={'start_date': '2025-01-01', 'end_date': '2025-12-31',
+                                           'rate': '1000', 'terms': '12', 'renter': '1'})
+    client.post('/renter/1/add_payment', data={'date': '2025-03-05', 'amount': '600', 'description': 'March'})
+
+    response = client.get('/export/rent_roll.csv?month=2025-03')
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 1
+    assert float(rows[0]['due']) == 1000
+    assert float(rows[0]['paid']) == 600